@@ -9,10 +9,13 @@ import sounddevice as sd
 import webrtcvad
 import noisereduce as nr
 from queue import Queue
-import subprocess
 from vosk import Model, KaldiRecognizer
 import random
 
+from src.metrics import registry
+from src.tts_cache import TTSCache
+from src.piper_worker import PiperWorker, SynthesisError
+
 class AudioAlerts:
     """
     Class to handle audio alerts for drowsiness detection with continuous playback,
@@ -27,7 +30,11 @@ class AudioAlerts:
                  relevant_topics_file='/tmp/relevant_driver_topics.txt',
                  piper_binary="models/piper/piper/piper",   
                  piper_model="models/piper/model_voice.onnx",
-                 vosk_model="models/vosk-model-small-en-us-0.15"):
+                 vosk_model="models/vosk-model-small-en-us-0.15",
+                 event_publisher=None,
+                 tts_cache_dir=None,
+                 tts_cache_max_disk_mb=50,
+                 tts_cache_max_memory_mb=16):
         """
         Initialize audio alerts
         
@@ -37,6 +44,10 @@ class AudioAlerts:
             volume (float): Volume level (0.0 to 1.0)
             gemini_api_key (str): API key for Gemini API
             gemini_api_url (str): URL for Gemini API endpoint
+            event_publisher (EventPublisher): Bus used to push status changes and responses to the server
+            tts_cache_dir (str): Directory of the synthesized speech cache (defaults to audio/cache)
+            tts_cache_max_disk_mb (float): Size budget of the speech cache on disk
+            tts_cache_max_memory_mb (float): Size budget of the decoded sounds kept in memory
         """
         self.normal_message = normal_message
         self.extreme_message = extreme_message
@@ -50,13 +61,21 @@ class AudioAlerts:
         self.last_system_audio_time = 0
         self.is_playing_audio = False
         self.context_file = '/tmp/driver_context.json'
+        self.event_publisher = event_publisher
+        self.published_status = None
+        self.published_response = None
         self._initialize_context()
 
         # Initialize Vosk model for speech recognition
         self.model = Model(self.vosk_model)
         
-        # Initialize pygame mixer
-        pygame.mixer.init()
+        # Piper runs as one long-lived process; the mixer uses its output format so
+        # raw PCM can be played as each sentence arrives
+        self.piper = PiperWorker(self.piper_binary, self.piper_model)
+        
+        # Initialize pygame mixer (allowedchanges=0 keeps this format and lets SDL convert
+        # for the device, so PCM buffers are always interpreted correctly)
+        pygame.mixer.init(frequency=self.piper.sample_rate, size=-16, channels=1, allowedchanges=0)
         pygame.mixer.set_num_channels(4)
         
         # Set up channels
@@ -65,6 +84,16 @@ class AudioAlerts:
         self.no_face_channel = pygame.mixer.Channel(2)
         self.gemini_channel = pygame.mixer.Channel(3)
         
+        # Synthesized speech is cached on disk and in memory, keyed by message and voice
+        audio_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audio")
+        self.tts_cache = TTSCache(
+            tts_cache_dir or os.path.join(audio_dir, "cache"),
+            voice_model=self.piper_model,
+            load=self._load_sound,
+            max_disk_bytes=int(tts_cache_max_disk_mb * 1024 * 1024),
+            max_memory_bytes=int(tts_cache_max_memory_mb * 1024 * 1024)
+        )
+        
         # Set up alert states
         self.normal_alert_active = False
         self.extreme_alert_active = False
@@ -190,84 +219,130 @@ class AudioAlerts:
         except Exception as e:
             print(f"Error in audio monitoring: {e}")
 
-    def _update_status_file(self, status):
-        """Write status to /tmp/drowsiness_status.txt"""
+    def _update_status(self, status):
+        """Push the status to the server, only when it changes"""
+        if status == self.published_status:
+            return
+        self.published_status = status
+        if self.event_publisher is not None:
+            self.event_publisher.publish({"type": "status", "status": status})
+    
+    def _synthesize(self, message, output_file):
+        """Synthesize a message to a WAV file with the Piper worker"""
         try:
-            with open('/tmp/drowsiness_status.txt', 'w') as f:
-                f.write(status)
-        except Exception as e:
-            print(f"Error writing to status file: {e}")
+            with registry.time("external_call_latency_seconds", service="piper"):
+                pcm = self.piper.synthesize(message)
+        except SynthesisError as e:
+            print(f"Error synthesizing audio for: {message}: {e}")
+            return False
+        if not pcm:
+            print(f"Error synthesizing audio for: {message}")
+            return False
+        self.piper.write_wav(output_file, pcm)
+        return True
+    
+    def _load_sound(self, path):
+        """Decode a WAV file with pygame, returning the sound and its decoded size in bytes"""
+        sound = pygame.mixer.Sound(path)
+        frequency, sample_format, channels = pygame.mixer.get_init()
+        size = int(sound.get_length() * frequency * channels * (abs(sample_format) // 8))
+        return sound, size
+    
+    def _get_sound(self, message):
+        """Get the sound for a message from the speech cache, synthesizing it on a miss"""
+        sound = self.tts_cache.get(message, self._synthesize)
+        if sound is not None:
+            sound.set_volume(self.volume)
+        return sound
     
     def _generate_audio_files(self):
-        """Generate audio files for alerts using Piper binary"""
-        audio_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audio")
-        os.makedirs(audio_dir, exist_ok=True)
-        
+        """Load the alert sounds, synthesizing them with Piper if they are not cached"""
         # Verify Piper binary and model exist
         if not os.path.isfile(self.piper_binary):
             raise FileNotFoundError(f"Piper binary not found at {self.piper_binary}")
         if not os.path.isfile(self.piper_model):
             raise FileNotFoundError(f"Piper model not found at {self.piper_model}")
         
+        # Load the voice model now so the first uncached message does not wait for it
+        self.piper.start()
+        
         for name, message in [("normal", self.normal_message), ("extreme", self.extreme_message)]:
-            output_file = os.path.join(audio_dir, f"alert_{name}.wav")
-            command = f'echo "{message}" | {self.piper_binary} --model {self.piper_model} --output_file {output_file}'
-            try:
-                result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
-                print(f"Generated {output_file} successfully")
-            except subprocess.SubprocessError as e:
-                error_msg = f"Failed to generate audio for {name}: {e}\nStderr: {e.stderr if hasattr(e, 'stderr') else 'N/A'}"
-                print(error_msg)
-                raise RuntimeError(error_msg)
-            
-            # Verify the output file exists
-            if not os.path.isfile(output_file):
-                raise FileNotFoundError(f"Audio file {output_file} was not created by Piper")
-            
-            # Load the sound with pygame
-            try:
-                sound = pygame.mixer.Sound(output_file)
-                sound.set_volume(self.volume)
-                setattr(self, f"{name}_alert_sound", sound)
-                print(f"Loaded {name}_alert_sound successfully")
-            except pygame.error as e:
-                raise RuntimeError(f"Failed to load {output_file} with pygame: {e}")
+            sound = self._get_sound(message)
+            if sound is None:
+                raise RuntimeError(f"Failed to generate audio for {name}")
+            setattr(self, f"{name}_alert_sound", sound)
+            print(f"Loaded {name}_alert_sound successfully")
             
             self.recent_system_messages.append(message.lower())
     
-    def _generate_temp_audio(self, message):
-        """Generate a temporary audio file with the given message using Piper binary"""
-        audio_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audio")
-        temp_audio_path = os.path.join(audio_dir, "temp_response.wav")
+    def _queue_chunk(self, channel, pcm):
+        """Play a PCM chunk on a channel right after the audio already playing or queued"""
+        sound = pygame.mixer.Sound(buffer=pcm)
+        sound.set_volume(self.volume)
+        if not channel.get_busy():
+            channel.play(sound)
+            return
+        # A channel holds a single queued sound; wait for the slot to free up
+        while channel.get_queue() is not None:
+            time.sleep(0.01)
+        if channel.get_busy():
+            channel.queue(sound)
+        else:
+            channel.play(sound)
+    
+    def _speak(self, message, channel, persist=True):
+        """
+        Play a response message, streaming it from Piper if it is not cached
+        
+        Playback starts with the first synthesized sentence; the utterance is added to
+        the speech cache afterwards, only if Piper finished all of it.
+        
+        Args:
+            message (str): Message to speak
+            channel (pygame.mixer.Channel): Channel to play on
+            persist (bool): Keep the audio in the on-disk cache (fixed prompts); one-off
+                            replies are only kept in memory
         
+        Returns:
+            bool: True if audio was played
+        """
         self.is_playing_audio = True
         self.last_system_audio_time = time.time()
+        self.recent_system_messages.append(message.lower())
+        if len(self.recent_system_messages) > 5:
+            self.recent_system_messages.pop(0)
         
-        command = f'echo "{message}" | {self.piper_binary} --model {self.piper_model} --output_file {temp_audio_path}'
-        try:
-            subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
-            print(f"Generated temporary audio: {temp_audio_path}")
-        except subprocess.SubprocessError as e:
-            print(f"Error generating temp audio: {e}\nStderr: {e.stderr if hasattr(e, 'stderr') else 'N/A'}")
-            return None
-        
-        # Verify the output file exists
-        if not os.path.isfile(temp_audio_path):
-            print(f"Error: Temporary audio file {temp_audio_path} was not created")
-            return None
+        sound = self.tts_cache.lookup(message)
+        if sound is not None:
+            sound.set_volume(self.volume)
+            channel.play(sound)
+            return True
         
+        start_time = time.perf_counter()
+        pcm = bytearray()
         try:
-            temp_sound = pygame.mixer.Sound(temp_audio_path)
-            temp_sound.set_volume(self.volume)
-        except pygame.error as e:
-            print(f"Error loading temporary audio with pygame: {e}")
-            return None
+            for chunk in self.piper.synthesize_stream(message):
+                if self.stop_voice_detection:
+                    # Conversation ended mid-reply: stop queuing, and do not cache the partial audio
+                    return True
+                if not pcm:
+                    registry.observe("tts_first_audio_seconds", time.perf_counter() - start_time)
+                pcm += chunk
+                self._queue_chunk(channel, chunk)
+        except SynthesisError as e:
+            # Whatever was played stays played, but a truncated utterance is not cached
+            print(f"Error synthesizing audio for: {message}: {e}")
+            return bool(pcm)
+        if not pcm:
+            print(f"Error synthesizing audio for: {message}")
+            return False
         
-        self.recent_system_messages.append(message.lower())
-        if len(self.recent_system_messages) > 5:
-            self.recent_system_messages.pop(0)
-            
-        return temp_sound
+        if persist:
+            self.tts_cache.get(message, lambda _, path: self.piper.write_wav(path, bytes(pcm)) or True)
+        else:
+            # The mixer uses the voice format, so the PCM is the decoded sound as is
+            self.tts_cache.put_memory(message, pygame.mixer.Sound(buffer=bytes(pcm)), len(pcm))
+        return True
     
     def _store_topic(self, topic):
         """
@@ -313,12 +388,20 @@ class AudioAlerts:
         return None
     
     def _save_gemini_response(self, message):
-        """Write Gemini response to /tmp/gemini_response.txt"""
-        try:
-            with open('/tmp/gemini_response.txt', 'w') as f:
-                f.write(message)
-        except Exception as e:
-            print(f"Error writing Gemini response: {e}")
+        """
+        Push the assistant response to the server as a new turn, only when it changes
+        
+        The Gemini request is not streamed, so each turn is sent as a single delta
+        holding the whole text; the server forwards deltas and full text to SSE clients.
+        
+        Args:
+            message (str): Full response text ("" clears the displayed response)
+        """
+        if message == self.published_response:
+            return
+        self.published_response = message
+        if self.event_publisher is not None:
+            self.event_publisher.publish({"type": "gemini", "text": message, "delta": message, "final": True})
     
     def _send_to_gemini_api(self, user_speech, drowsiness_level):
         if not self.gemini_api_key:
@@ -360,8 +443,9 @@ class AudioAlerts:
         url = f"{self.gemini_api_url}?key={self.gemini_api_key}"
         
         try:
-            self._update_status_file("SYSTEM")
-            response = requests.post(url, headers=headers, json=data)
+            self._update_status("SYSTEM")
+            with registry.time("external_call_latency_seconds", service="gemini"):
+                response = requests.post(url, headers=headers, json=data)
             response.raise_for_status()
             resp_json = response.json()
             text_response = resp_json.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
@@ -476,9 +560,10 @@ class AudioAlerts:
                     return False
             
             # Process audio with Vosk
-            recognizer = KaldiRecognizer(self.model, self.sample_rate)
-            recognizer.AcceptWaveform(audio_data.astype(np.int16).tobytes())
-            result = recognizer.Result()
+            with registry.time("external_call_latency_seconds", service="vosk"):
+                recognizer = KaldiRecognizer(self.model, self.sample_rate)
+                recognizer.AcceptWaveform(audio_data.astype(np.int16).tobytes())
+                result = recognizer.Result()
             user_speech = json.loads(result).get("text", "")
             print(f"Raw recognized text: {user_speech}")
             
@@ -490,6 +575,9 @@ class AudioAlerts:
             
             # Send to Gemini API
             gemini_response = self._send_to_gemini_api(user_speech, self.current_drowsiness_level)
+            if self.stop_voice_detection:
+                # The conversation was ended while waiting for Gemini
+                return False
             self.system_alert_active = True
 
             # Process response
@@ -497,34 +585,30 @@ class AudioAlerts:
                 print("System is convinced the driver is alert.")
                 self.conversation_history = []  # Reset conversation history
                 # Play confirmation message 
-                self._update_status_file("SYSTEM")
+                self._update_status("SYSTEM")
                 self._save_gemini_response("You seem alert now. Drive safely.")
-                confirm_sound = self._generate_temp_audio("You seem alert now. Drive safely.")
-                if confirm_sound:
-                    self.stop_all_alerts()
-                    self.gemini_channel.stop()
-                    self.gemini_channel.play(confirm_sound)
+                self.stop_all_alerts()
+                self.gemini_channel.stop()
+                self._speak("You seem alert now. Drive safely.", self.gemini_channel)
                 self._save_gemini_response("")
                 return True
             else:
                 # Play custom message from Gemini
                 message = gemini_response.get("message", "I'm not convinced you're fully alert. Please continue focusing.")
                 print(f"Gemini response: {message}")
-                self._update_status_file("SYSTEM")
+                self._update_status("SYSTEM")
                 self._save_gemini_response(message)
-                response_sound = self._generate_temp_audio(message)
-                if response_sound:
-                    self.stop_all_alerts()
-                    self.gemini_channel.play(response_sound)
+                self.stop_all_alerts()
+                if self._speak(message, self.gemini_channel, persist=False):
                     while self.gemini_channel.get_busy():
                         time.sleep(0.1)
-                self._update_status_file(self.current_drowsiness_level)
+                self._update_status(self.current_drowsiness_level)
                 self._save_gemini_response("")
                 return False
                 
         except Exception as e:
             print(f"Error processing voice with Gemini: {e}")
-            self._update_status_file(self.current_drowsiness_level)
+            self._update_status(self.current_drowsiness_level)
             self._save_gemini_response("")
             return False
     
@@ -542,7 +626,7 @@ class AudioAlerts:
                        self.no_face_channel.get_busy()):
                     time.sleep(0.1)
                     if self.stop_voice_detection:
-                        self._update_status_file(self.current_drowsiness_level)
+                        self._update_status(self.current_drowsiness_level)
                         return
                 
                 self.is_playing_audio = False
@@ -558,7 +642,7 @@ class AudioAlerts:
                 self.gemini_channel.stop()
                 self.no_face_channel.stop()
                 
-                self._update_status_file("LISTENING")
+                self._update_status("LISTENING")
                 # Capture audio using sounddevice
                 print("Listening for driver response...")
                 audio_data = sd.rec(
@@ -568,6 +652,8 @@ class AudioAlerts:
                     dtype='int16'
                 )
                 sd.wait()  # Wait until recording is finished
+                if self.stop_voice_detection:
+                    break
                 
                 # Process the captured audio
                 is_alert = self._process_voice_with_gemini(audio_data.flatten())
@@ -580,10 +666,24 @@ class AudioAlerts:
             
             time.sleep(0.1)
     
+    def end_conversation(self):
+        """
+        End the voice conversation and silence its speech (e.g. the drive is over)
+        
+        A recording in progress is discarded without being sent to Gemini, and a
+        reply that is still being spoken is cut off.
+        """
+        self.stop_voice_detection = True
+        sd.stop()
+        self.gemini_channel.stop()
+        self.no_face_channel.stop()
+        self.system_alert_active = False
+        self._save_gemini_response("")
+    
     def start_voice_detection(self):
         """Start voice detection in a separate thread"""
         if (self.voice_detection_thread is None or not self.voice_detection_thread.is_alive()) and not self.system_alert_active:
-            self._update_status_file("LISTENING")
+            self._update_status("LISTENING")
             self.voice_detection_thread = threading.Thread(target=self._listen_for_response, daemon=True)
             self.voice_detection_thread.start()
     
@@ -599,10 +699,11 @@ class AudioAlerts:
             if not hasattr(self, 'normal_alert_sound'):
                 print("Error: normal_alert_sound not initialized. Cannot play normal alert.")
                 return
-            self._update_status_file("NORMAL")
+            self._update_status("NORMAL")
             self.gemini_channel.stop()
             self.normal_alert_active = True
             self.normal_channel.play(self.normal_alert_sound, loops=0)
+            registry.inc("alerts_total", level="normal")
             self.is_playing_audio = True
             self.last_system_audio_time = time.time()
             self.start_voice_detection()
@@ -618,10 +719,11 @@ class AudioAlerts:
                 if not hasattr(self, 'extreme_alert_sound'):
                     print("Error: extreme_alert_sound not initialized. Cannot play extreme alert.")
                     return
-                self._update_status_file("EXTREME")
+                self._update_status("EXTREME")
                 self.gemini_channel.stop()
                 self.extreme_alert_active = True
                 self.extreme_channel.play(self.extreme_alert_sound, loops=0)
+                registry.inc("alerts_total", level="extreme")
                 self.is_playing_audio = True
                 self.last_system_audio_time = time.time()
                 self.start_voice_detection()
@@ -660,17 +762,18 @@ class AudioAlerts:
         elif drowsiness_level == "NORMAL":
             self.play_normal_alert()
         else:
-            self._update_status_file("AWAKE")
+            self._update_status("AWAKE")
             self.stop_all_alerts()
             self.conversation_history = []  # Reset conversation history when driver is AWAKE
     
     def cleanup(self):
         """Clean up resources"""
-        self.stop_voice_detection = True
+        self.end_conversation()
         self.stop_audio_monitoring = True
         if self.audio_output_thread and self.audio_output_thread.is_alive():
             self.audio_output_thread.join(1.0)
         self.stop_all_alerts()
+        self.piper.stop()
         pygame.mixer.quit()
 
     def play_no_face_alert(self, message="No face detected! Please position yourself in front of the camera."):
@@ -680,28 +783,10 @@ class AudioAlerts:
         Args:
             message (str): Message to play when no face is detected
         """
-        audio_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "audio")
-        os.makedirs(audio_dir, exist_ok=True)
-        
-        no_face_audio_path = os.path.join(audio_dir, "alert_no_face.wav")
-        command = f'echo "{message}" | {self.piper_binary} --model {self.piper_model} --output_file {no_face_audio_path}'
-        try:
-            subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
-            print(f"Generated no face alert audio: {no_face_audio_path}")
-        except subprocess.SubprocessError as e:
-            print(f"Error generating no face alert audio: {e}\nStderr: {e.stderr if hasattr(e, 'stderr') else 'N/A'}")
-            return
-        
-        # Verify the output file exists
-        if not os.path.isfile(no_face_audio_path):
-            print(f"Error: No face alert audio file {no_face_audio_path} was not created")
-            return
-        
-        try:
-            no_face_sound = pygame.mixer.Sound(no_face_audio_path)
-            no_face_sound.set_volume(self.volume)
-        except pygame.error as e:
-            print(f"Error loading no face alert audio with pygame: {e}")
+        # Cached after the first alert, so repeated alerts cost no synthesis
+        no_face_sound = self._get_sound(message)
+        if no_face_sound is None:
+            print("Error: Could not generate no face alert audio")
             return
         
         self.recent_system_messages.append(message.lower())
@@ -711,4 +796,5 @@ class AudioAlerts:
         self.is_playing_audio = True
         self.last_system_audio_time = time.time()
         
-        self.no_face_channel.play(no_face_sound)
\ No newline at end of file
+        self.no_face_channel.play(no_face_sound)
+        registry.inc("alerts_total", level="no_face")
\ No newline at end of file
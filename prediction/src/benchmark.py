@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Driver Drowsiness Detection System - Per-stage micro-benchmarks for the vision hot path
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import cv2
+import dlib
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import load_config
+from src.pipeline import create_vision_components
+from src.renderer import FrameRenderer
+from src.replay import ReplaySource
+
+STAGES = ["blob", "ssd_forward", "postprocess", "shape_predictor",
+          "landmark_conversion", "ear", "drowsiness", "annotation"]
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Per-stage vision pipeline benchmark")
+    parser.add_argument("--config", type=str, default="../config/config.yaml",
+                        help="Path to configuration file")
+    parser.add_argument("--source", type=str, default=None,
+                        help="Recorded video or image directory (synthetic frames if omitted)")
+    parser.add_argument("--frames", type=int, default=30,
+                        help="Number of distinct frames to benchmark on")
+    parser.add_argument("--iterations", type=int, default=300,
+                        help="Timed calls per stage")
+    parser.add_argument("--alloc-iterations", type=int, default=20,
+                        help="Calls per stage traced for allocations (0 to skip)")
+    parser.add_argument("--output", type=str, default="benchmark_results.json",
+                        help="Machine-readable results file")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="Earlier results file to compare against")
+    return parser.parse_args()
+
+def load_frames(args, config):
+    """Load recorded frames or generate synthetic ones"""
+    if args.source:
+        source = ReplaySource(args.source, fps=config['camera']['fps'])
+        frames = []
+        while len(frames) < args.frames:
+            frame, _ = source.read()
+            if frame is None:
+                break
+            frames.append(frame)
+        source.release()
+        if not frames:
+            print(f"Error: No frames read from {args.source}")
+            sys.exit(1)
+        return frames
+
+    width, height = config['camera']['resolution']
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(args.frames)]
+
+def prepare_inputs(frames, face_detector, eye_detector):
+    """Run every stage once per frame so each stage can be timed on realistic inputs"""
+    inputs = []
+    for frame in frames:
+        (h, w) = frame.shape[:2]
+        blob = face_detector.make_blob(frame)
+        detections = face_detector.backend.infer(blob)
+        faces, confidences = face_detector._process_detections(frame, detections[0, 0], (0, 0, w, h))
+
+        # Synthetic frames have no faces; benchmark the landmark stages on a central box
+        face = faces[0] if faces else [w // 3, h // 4, w // 3, h // 2]
+        x, y, fw, fh = face
+        rect = dlib.rectangle(x, y, x + fw, y + fh)
+        shape = eye_detector.predictor(frame, rect)
+        landmarks = eye_detector.shape_to_array(shape)
+        left_ear, right_ear = eye_detector.calculate_eye_aspect_ratio(landmarks)
+
+        inputs.append({
+            "frame": frame,
+            "blob": blob,
+            "detections": detections,
+            "rect": rect,
+            "shape": shape,
+            "landmarks": landmarks,
+            "result": {
+                "face": face,
+                "confidence": confidences[0] if confidences else None,
+                "landmarks": landmarks,
+                "left_ear": left_ear,
+                "right_ear": right_ear,
+                "avg_ear": (left_ear + right_ear) / 2.0,
+                "level": "AWAKE"
+            }
+        })
+    return inputs
+
+def make_stage_calls(inputs, face_detector, eye_detector, drowsiness_detector, renderer):
+    """Build a callable per stage taking the prepared inputs of one frame"""
+    landmark_buffer = np.zeros((eye_detector.num_landmarks, 2), dtype=np.int32)
+    canvas = {}
+    clock = {"t": 0.0}
+
+    def annotation(item):
+        frame = item["frame"]
+        target = canvas.get(frame.shape)
+        if target is None:
+            target = canvas[frame.shape] = np.empty_like(frame)
+        np.copyto(target, frame)
+        renderer.render(target, [item["result"]], 30.0, True, 0.0)
+
+    def drowsiness(item):
+        clock["t"] += 1.0 / 30.0
+        drowsiness_detector.detect(item["result"]["avg_ear"], clock["t"])
+
+    return {
+        "blob": lambda item: face_detector.make_blob(item["frame"]),
+        "ssd_forward": lambda item: face_detector.backend.infer(item["blob"]),
+        "postprocess": lambda item: face_detector._process_detections(
+            item["frame"], item["detections"][0, 0],
+            (0, 0, item["frame"].shape[1], item["frame"].shape[0])),
+        "shape_predictor": lambda item: eye_detector.predictor(item["frame"], item["rect"]),
+        "landmark_conversion": lambda item: eye_detector.shape_to_array(item["shape"], landmark_buffer),
+        "ear": lambda item: eye_detector.calculate_eye_aspect_ratio(item["landmarks"]),
+        "drowsiness": drowsiness,
+        "annotation": annotation,
+    }
+
+def time_stage(call, inputs, iterations):
+    """Time a stage and return its latency percentiles in milliseconds"""
+    # Warm up caches and lazily allocated buffers
+    for item in inputs[:3]:
+        call(item)
+
+    timings = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        item = inputs[i % len(inputs)]
+        start = time.perf_counter_ns()
+        call(item)
+        timings[i] = time.perf_counter_ns() - start
+    timings /= 1e6
+
+    return {
+        "iterations": iterations,
+        "mean_ms": float(timings.mean()),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "max_ms": float(timings.max()),
+    }
+
+def trace_allocations(call, inputs, iterations):
+    """Measure Python-visible allocations (including NumPy buffers) per stage call"""
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    try:
+        for i in range(iterations):
+            item = inputs[i % len(inputs)]
+            before = tracemalloc.take_snapshot()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            call(item)
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            peaks.append(peak - current)
+            blocks.append(sum(max(0, stat.count_diff) for stat in after.compare_to(before, "lineno")))
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "alloc_peak_kb": float(np.mean(peaks)) / 1024.0,
+        "retained_blocks": float(np.mean(blocks)),
+    }
+
+def git_revision():
+    """Get the current commit hash, if available"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(current, baseline_path):
+    """Print p50/p95 changes relative to an earlier results file"""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+
+    print(f"\nComparison with {baseline.get('commit') or baseline_path}:")
+    print(f"{'stage':<22}{'p50 ms':>10}{'was':>10}{'change':>10}{'p95 ms':>10}{'was':>10}")
+    for stage in STAGES:
+        new = current["stages"].get(stage)
+        old = baseline.get("stages", {}).get(stage)
+        if not new or not old:
+            continue
+        change = (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+        print(f"{stage:<22}{new['p50_ms']:>10.3f}{old['p50_ms']:>10.3f}{change:>+9.1f}%"
+              f"{new['p95_ms']:>10.3f}{old['p95_ms']:>10.3f}")
+
+def main():
+    """Run the per-stage benchmark"""
+    args = parse_args()
+    config = load_config(args.config)
+
+    # Same process-wide OpenCV thread count as the application
+    opencv_threads = config.get('pipeline', {}).get('opencv_threads', 0)
+    if opencv_threads:
+        cv2.setNumThreads(opencv_threads)
+
+    face_detector, eye_detector, drowsiness_detector = create_vision_components(config)
+    renderer = FrameRenderer(face_detector, eye_detector,
+                             eye_threshold=drowsiness_detector.eye_aspect_ratio_threshold,
+                             mode="always")
+
+    frames = load_frames(args, config)
+    inputs = prepare_inputs(frames, face_detector, eye_detector)
+    calls = make_stage_calls(inputs, face_detector, eye_detector, drowsiness_detector, renderer)
+
+    results = {
+        "commit": git_revision(),
+        "timestamp": time.time(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "source": args.source or "synthetic",
+        "frames": len(frames),
+        "resolution": list(frames[0].shape[1::-1]),
+        "backend": getattr(face_detector.backend, "description", ""),
+        "stages": {},
+    }
+
+    print(f"{'stage':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'alloc KB':>10}{'retained':>10}")
+    for stage in STAGES:
+        stats = time_stage(calls[stage], inputs, args.iterations)
+        if args.alloc_iterations > 0:
+            stats.update(trace_allocations(calls[stage], inputs, args.alloc_iterations))
+        results["stages"][stage] = stats
+        print(f"{stage:<22}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+              f"{stats.get('alloc_peak_kb', 0.0):>10.1f}{stats.get('retained_blocks', 0.0):>10.1f}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Incremental blink and microsleep feature extraction from the eye aspect ratio stream
+"""
+
+import numpy as np
+
+class BlinkFeatureExtractor:
+    """
+    Class to segment blinks and microsleeps from per-frame EAR samples
+
+    Each update costs O(1): completed events are kept in preallocated ring arrays
+    and the windowed statistics are maintained as running sums.
+    """
+
+    def __init__(self, close_threshold=0.3, open_hysteresis=0.02, microsleep_duration=0.5,
+                 window=60.0, capacity=128, max_gap=1.0):
+        """
+        Initialize the feature extractor
+
+        Args:
+            close_threshold (float): EAR below which the eyes are considered closed
+            open_hysteresis (float): EAR margin above close_threshold required to end a closure
+            microsleep_duration (float): Closures at least this long (seconds) count as microsleeps
+            window (float): Length in seconds of the window for rates and averages
+            capacity (int): Maximum number of events kept in the window
+            max_gap (float): Sample gap in seconds after which an ongoing closure is discarded
+        """
+        self.close_threshold = close_threshold
+        self.open_hysteresis = open_hysteresis
+        self.microsleep_duration = microsleep_duration
+        self.window = window
+        self.capacity = capacity
+        self.max_gap = max_gap
+
+        # Completed events in the window, oldest at self.head
+        self.event_times = np.zeros(capacity, dtype=np.float64)
+        self.event_durations = np.zeros(capacity, dtype=np.float64)
+        self.event_closing_speeds = np.zeros(capacity, dtype=np.float64)
+        self.event_reopening_speeds = np.zeros(capacity, dtype=np.float64)
+        self.event_is_microsleep = np.zeros(capacity, dtype=bool)
+        self.head = 0
+        self.count = 0
+
+        # Running sums over the events in the window (blink sums exclude microsleeps)
+        self.blink_count = 0
+        self.microsleep_count = 0
+        self.blink_duration_sum = 0.0
+        self.closing_speed_sum = 0.0
+        self.reopening_speed_sum = 0.0
+
+        # Totals since start
+        self.total_blinks = 0
+        self.total_microsleeps = 0
+
+        # Current closure state
+        self.closed = False
+        self.closure_start_time = None
+        self.reference_ear = None
+        self.reference_time = None
+        self.min_ear = None
+        self.min_time = None
+        self.first_time = None
+        self.last_ear = None
+        self.last_time = None
+
+    def update(self, ear, timestamp):
+        """
+        Feed one EAR sample
+
+        Args:
+            ear (float): Average eye aspect ratio of the frame
+            timestamp (float): Time of the sample in seconds
+
+        Returns:
+            str: "BLINK" or "MICROSLEEP" when an event ended on this sample, else None
+        """
+        event = None
+        if self.first_time is None:
+            self.first_time = timestamp
+        self._evict(timestamp)
+
+        # A long gap (face lost, paused stream) makes the ongoing closure unreliable
+        if self.last_time is not None and timestamp - self.last_time > self.max_gap:
+            self.closed = False
+            self.last_ear = None
+            self.last_time = None
+
+        if not self.closed:
+            if ear < self.close_threshold:
+                self.closed = True
+                self.closure_start_time = timestamp
+                # The closing phase starts at the last open-eye sample
+                self.reference_ear = self.last_ear if self.last_ear is not None else ear
+                self.reference_time = self.last_time if self.last_time is not None else timestamp
+                self.min_ear = ear
+                self.min_time = timestamp
+        else:
+            if ear < self.min_ear:
+                self.min_ear = ear
+                self.min_time = timestamp
+            if ear >= self.close_threshold + self.open_hysteresis:
+                self.closed = False
+                event = self._record_event(ear, timestamp)
+
+        self.last_ear = ear
+        self.last_time = timestamp
+        return event
+
+    def _record_event(self, ear, timestamp):
+        """Store a completed closure and update the running sums"""
+        duration = timestamp - self.closure_start_time
+        closing_speed = (self.reference_ear - self.min_ear) / max(self.min_time - self.reference_time, 1e-3)
+        reopening_speed = (ear - self.min_ear) / max(timestamp - self.min_time, 1e-3)
+        is_microsleep = duration >= self.microsleep_duration
+
+        if self.count == self.capacity:
+            self._evict_oldest()
+        slot = (self.head + self.count) % self.capacity
+        self.event_times[slot] = timestamp
+        self.event_durations[slot] = duration
+        self.event_closing_speeds[slot] = closing_speed
+        self.event_reopening_speeds[slot] = reopening_speed
+        self.event_is_microsleep[slot] = is_microsleep
+        self.count += 1
+
+        if is_microsleep:
+            self.microsleep_count += 1
+            self.total_microsleeps += 1
+            return "MICROSLEEP"
+
+        self.blink_count += 1
+        self.total_blinks += 1
+        self.blink_duration_sum += duration
+        self.closing_speed_sum += closing_speed
+        self.reopening_speed_sum += reopening_speed
+        return "BLINK"
+
+    def _evict(self, timestamp):
+        """Drop events that left the window"""
+        window_start = timestamp - self.window
+        while self.count and self.event_times[self.head] <= window_start:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        """Remove the oldest event from the window"""
+        slot = self.head
+        if self.event_is_microsleep[slot]:
+            self.microsleep_count -= 1
+        else:
+            self.blink_count -= 1
+            self.blink_duration_sum -= self.event_durations[slot]
+            self.closing_speed_sum -= self.event_closing_speeds[slot]
+            self.reopening_speed_sum -= self.event_reopening_speeds[slot]
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+        if not self.count:
+            # Resynchronize the running sums to avoid floating point drift
+            self.blink_duration_sum = self.closing_speed_sum = self.reopening_speed_sum = 0.0
+
+    def current_closure_duration(self, timestamp):
+        """
+        Get how long the eyes have been closed in the ongoing closure
+
+        Args:
+            timestamp (float): Current time in seconds
+
+        Returns:
+            float: Seconds since the closure started, or 0 if the eyes are open
+        """
+        if not self.closed:
+            return 0.0
+        return timestamp - self.closure_start_time
+
+    def features(self):
+        """
+        Get the current windowed features
+
+        Returns:
+            dict: Blink rate per minute, mean blink duration (s), mean closing and
+                  reopening speeds (EAR/s), microsleeps in the window and totals
+        """
+        elapsed = self.last_time - self.first_time if self.last_time is not None else 0.0
+        span = min(self.window, elapsed)
+        blinks = self.blink_count
+        return {
+            "blink_rate": blinks * 60.0 / span if span > 0 else 0.0,
+            "blink_duration": float(self.blink_duration_sum) / blinks if blinks else 0.0,
+            "closing_speed": float(self.closing_speed_sum) / blinks if blinks else 0.0,
+            "reopening_speed": float(self.reopening_speed_sum) / blinks if blinks else 0.0,
+            "microsleeps": self.microsleep_count,
+            "total_blinks": self.total_blinks,
+            "total_microsleeps": self.total_microsleeps,
+        }
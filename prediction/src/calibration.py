@@ -0,0 +1,170 @@
+"""
+Online per-driver eye aspect ratio baseline calibration
+"""
+
+class P2Quantile:
+    """
+    Constant-memory streaming quantile estimator (P-square algorithm, Jain & Chlamtac 1985)
+    """
+
+    def __init__(self, quantile=0.5):
+        """
+        Initialize the estimator
+
+        Args:
+            quantile (float): Quantile to estimate, between 0 and 1
+        """
+        self.quantile = quantile
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value):
+        """Add one observation"""
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            if self.count == 5:
+                heights.sort()
+            return
+
+        # Find the cell containing the value, extending the extremes if needed
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        positions = self.positions
+        for i in range(1, 4):
+            offset = self.desired[i] - positions[i]
+            if ((offset >= 1 and positions[i + 1] - positions[i] > 1) or
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        """Piecewise-parabolic prediction of marker i moved by step"""
+        heights, positions = self.heights, self.positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i]) +
+            (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+
+    def value(self):
+        """
+        Get the current estimate
+
+        Returns:
+            float: Estimated quantile, or None before the first observation
+        """
+        if not self.count:
+            return None
+        if self.count < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+        return self.heights[2]
+
+
+class EARBaselineCalibrator:
+    """
+    Class to estimate a driver's open-eye EAR at the start of a drive and derive
+    drowsiness thresholds relative to it
+    """
+
+    def __init__(self, duration=120.0, min_samples=300, quantile=0.8, closed_ratio=0.8,
+                 normal_ratio=0.7, extreme_ratio=0.6, min_threshold=0.12, max_threshold=0.4):
+        """
+        Initialize the calibrator
+
+        Args:
+            duration (float): Seconds of driving to collect before calibrating
+            min_samples (int): Minimum number of EAR samples required
+            quantile (float): Quantile of the EAR distribution used as the open-eye baseline
+                              (above the median so blinks and closures do not pull it down)
+            closed_ratio (float): Eyes-closed threshold as a fraction of the baseline
+            normal_ratio (float): NORMAL drowsiness EAR threshold as a fraction of the baseline
+            extreme_ratio (float): EXTREME drowsiness EAR threshold as a fraction of the baseline
+            min_threshold (float): Lower bound for any derived threshold
+            max_threshold (float): Upper bound for any derived threshold
+        """
+        self.duration = duration
+        self.min_samples = min_samples
+        self.closed_ratio = closed_ratio
+        self.normal_ratio = normal_ratio
+        self.extreme_ratio = extreme_ratio
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+
+        self.estimator = P2Quantile(quantile)
+        self.start_time = None
+        self.calibrated = False
+        self.baseline = None
+
+    def update(self, ear, timestamp):
+        """
+        Add one EAR sample to the calibration
+
+        All samples are used, including those the fixed thresholds classify as
+        closed: for a driver with narrow eyes that is most of them. Blinks and
+        closures sit in the low tail of the distribution, so a high quantile
+        tracks the open-eye EAR unless the eyes are closed most of the time.
+
+        Args:
+            ear (float): Average eye aspect ratio
+            timestamp (float): Time of the sample in seconds
+
+        Returns:
+            bool: True if calibration completed on this sample
+        """
+        if self.calibrated:
+            return False
+        if self.start_time is None:
+            self.start_time = timestamp
+        self.estimator.add(ear)
+
+        if timestamp - self.start_time >= self.duration and self.estimator.count >= self.min_samples:
+            self.baseline = self.estimator.value()
+            self.calibrated = True
+            return True
+        return False
+
+    def reset(self):
+        """Discard the baseline and start collecting samples again (e.g. for a new driver)"""
+        self.estimator = P2Quantile(self.estimator.quantile)
+        self.start_time = None
+        self.calibrated = False
+        self.baseline = None
+
+    def thresholds(self):
+        """
+        Get the thresholds derived from the baseline
+
+        Returns:
+            dict: eye_aspect_ratio_threshold, normal_ear_threshold and extreme_ear_threshold
+        """
+        def clamp(ratio):
+            return min(self.max_threshold, max(self.min_threshold, self.baseline * ratio))
+
+        return {
+            "eye_aspect_ratio_threshold": clamp(self.closed_ratio),
+            "normal_ear_threshold": clamp(self.normal_ratio),
+            "extreme_ear_threshold": clamp(self.extreme_ratio),
+        }
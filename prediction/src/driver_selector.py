@@ -0,0 +1,88 @@
+"""
+Primary driver selection among the faces found in a frame
+"""
+
+class DriverSelector:
+    """
+    Class to pick the driver's face by size, position and continuity with the previous frame
+    """
+
+    # Expected horizontal position of the driver's face as a fraction of the frame width
+    SIDE_POSITIONS = {"left": 0.25, "center": 0.5, "right": 0.75}
+
+    def __init__(self, enabled=True, driver_side="center", size_weight=0.5, position_weight=0.2,
+                 continuity_weight=0.3, switch_margin=0.15):
+        """
+        Initialize the driver selector
+
+        Args:
+            enabled (bool): If False, select() returns None and every face is analyzed
+            driver_side (str): Where the driver sits in the image: "left", "center" or "right"
+            size_weight (float): Weight of the face size relative to the largest face
+            position_weight (float): Weight of the closeness to the expected driver position
+            continuity_weight (float): Weight of the overlap with the previous driver face
+            switch_margin (float): Score advantage another face needs to take over from the
+                                   face matching the previous driver
+        """
+        self.enabled = enabled
+        self.target_x = self.SIDE_POSITIONS.get(driver_side, 0.5)
+        self.size_weight = size_weight
+        self.position_weight = position_weight
+        self.continuity_weight = continuity_weight
+        self.switch_margin = switch_margin
+        self.last_box = None
+
+    def reset(self):
+        """Forget the previously selected driver"""
+        self.last_box = None
+
+    def select(self, faces, frame_shape):
+        """
+        Pick the driver among the detected faces
+
+        Args:
+            faces (list): Face bounding boxes [x, y, width, height]
+            frame_shape (tuple): Shape of the frame the faces were found in
+
+        Returns:
+            int: Index of the driver's face, or None if there are no faces or selection is disabled
+        """
+        if not self.enabled or not faces:
+            return None
+        if len(faces) == 1:
+            self.last_box = faces[0]
+            return 0
+
+        frame_w = frame_shape[1]
+        max_area = max(w * h for _, _, w, h in faces) or 1
+        scores = []
+        overlaps = []
+        for x, y, w, h in faces:
+            size = (w * h) / max_area
+            position = 1.0 - min(1.0, abs((x + w / 2) / frame_w - self.target_x) / 0.5)
+            overlap = self._iou(self.last_box, (x, y, w, h)) if self.last_box is not None else 0.0
+            overlaps.append(overlap)
+            scores.append(self.size_weight * size + self.position_weight * position +
+                          self.continuity_weight * overlap)
+
+        best = max(range(len(faces)), key=lambda i: scores[i])
+
+        # Stay with the previous driver unless another face is clearly better
+        previous = max(range(len(faces)), key=lambda i: overlaps[i])
+        if overlaps[previous] > 0.3 and scores[best] < scores[previous] + self.switch_margin:
+            best = previous
+
+        self.last_box = faces[best]
+        return best
+
+    @staticmethod
+    def _iou(box_a, box_b):
+        """Intersection over union of two [x, y, width, height] boxes"""
+        ax, ay, aw, ah = box_a
+        bx, by, bw, bh = box_b
+        inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+        inter_h = min(ay + ah, by + bh) - max(ay, by)
+        if inter_w <= 0 or inter_h <= 0:
+            return 0.0
+        intersection = inter_w * inter_h
+        return intersection / float(aw * ah + bw * bh - intersection)
@@ -3,6 +3,10 @@ Drowsiness detection module using eye aspect ratio analysis
 """
 
 import time
+from collections import deque
+import numpy as np
+
+from src.blink_features import BlinkFeatureExtractor
 
 class DrowsinessDetector:
     """
@@ -11,7 +15,10 @@ class DrowsinessDetector:
     
     def __init__(self, eye_aspect_ratio_threshold=0.3, consecutive_frames_threshold=10,
                  normal_duration_threshold=1.5, extreme_duration_threshold=0.8,
-                 normal_ear_threshold=0.3, extreme_ear_threshold=0.25):
+                 normal_ear_threshold=0.3, extreme_ear_threshold=0.25,
+                 closure_window=1.0, max_sample_duration=0.25, clock=None,
+                 microsleep_duration=0.5, microsleep_alert_count=0, blink_window=60.0,
+                 calibrator=None):
         """
         Initialize drowsiness detector
         
@@ -22,6 +29,17 @@ class DrowsinessDetector:
             extreme_duration_threshold (float): Duration in seconds for extreme drowsiness level
             normal_ear_threshold (float): EAR threshold for normal drowsiness level
             extreme_ear_threshold (float): EAR threshold for extreme drowsiness level
+            closure_window (float): Length in seconds of the eye closure percentage window
+            max_sample_duration (float): Longest time in seconds a single sample may cover
+                                         (bounds the weight of a sample after a gap)
+            clock (callable): Monotonic clock used when no timestamp is given
+                              (defaults to time.monotonic)
+            microsleep_duration (float): Closures at least this long (seconds) count as microsleeps
+            microsleep_alert_count (int): Microsleeps within blink_window that hold at least the
+                                          NORMAL level (0 disables)
+            blink_window (float): Window in seconds for blink and microsleep features
+            calibrator (EARBaselineCalibrator): Optional per-driver calibration that replaces
+                                                the EAR thresholds once it has a baseline
         """
         self.eye_aspect_ratio_threshold = eye_aspect_ratio_threshold
         self.consecutive_frames_threshold = consecutive_frames_threshold
@@ -29,6 +47,8 @@ class DrowsinessDetector:
         self.extreme_duration_threshold = extreme_duration_threshold
         self.normal_ear_threshold = normal_ear_threshold
         self.extreme_ear_threshold = extreme_ear_threshold
+        self.configured_thresholds = (eye_aspect_ratio_threshold, normal_ear_threshold,
+                                      extreme_ear_threshold)
         
         # Initialize counters and timers
         self.closed_eyes_frames = 0
@@ -36,39 +56,245 @@ class DrowsinessDetector:
         self.last_alert_time = 0
         self.current_drowsiness_level = "AWAKE"
         
+        self.clock = clock or time.monotonic
+        
         # Add eye closure percentage tracking (for gradual detection)
-        self.eye_closure_history = []
-        self.history_size = 30  # Track last 30 frames
+        # Each sample covers the time since the previous one; the window is defined in
+        # seconds so the percentage does not depend on the processing frame rate
+        self.closure_window = closure_window
+        self.max_sample_duration = max_sample_duration
+        self.eye_closure_history = deque()  # (timestamp, duration, is_closed)
+        self.window_duration = 0.0
+        self.closed_duration = 0.0
+        self.last_sample_time = None
+        self.closure_percentage = 0
+        
+        # Blink and microsleep features from the same EAR stream
+        self.microsleep_alert_count = microsleep_alert_count
+        self.blink_features = BlinkFeatureExtractor(
+            close_threshold=eye_aspect_ratio_threshold,
+            microsleep_duration=microsleep_duration,
+            window=blink_window
+        )
+        
+        # Per-driver baseline calibration (thresholds above are used until it completes)
+        self.calibrator = calibrator
+    
+    def set_thresholds(self, eye_aspect_ratio_threshold, normal_ear_threshold, extreme_ear_threshold):
+        """
+        Replace the EAR thresholds
+        
+        Args:
+            eye_aspect_ratio_threshold (float): Threshold for eye aspect ratio to consider eyes closed
+            normal_ear_threshold (float): EAR threshold for normal drowsiness level
+            extreme_ear_threshold (float): EAR threshold for extreme drowsiness level
+        """
+        self.eye_aspect_ratio_threshold = eye_aspect_ratio_threshold
+        self.normal_ear_threshold = normal_ear_threshold
+        self.extreme_ear_threshold = extreme_ear_threshold
+        self.blink_features.close_threshold = eye_aspect_ratio_threshold
+    
+    def reset(self):
+        """
+        Forget all history so a new drive starts from a clean state
         
+        Restores the configured thresholds and restarts the calibration.
+        """
+        self.set_thresholds(*self.configured_thresholds)
+        self.closed_eyes_frames = 0
+        self.drowsy_start_time = None
+        self.last_alert_time = 0
+        self.current_drowsiness_level = "AWAKE"
+        self.eye_closure_history.clear()
+        self.window_duration = 0.0
+        self.closed_duration = 0.0
+        self.last_sample_time = None
+        self.closure_percentage = 0
+        self.blink_features = BlinkFeatureExtractor(
+            close_threshold=self.eye_aspect_ratio_threshold,
+            microsleep_duration=self.blink_features.microsleep_duration,
+            window=self.blink_features.window
+        )
+        if self.calibrator is not None:
+            self.calibrator.reset()
+    
+    def _calibrate(self, eye_aspect_ratio, timestamp):
+        """Feed the calibrator and apply its thresholds once the baseline is known"""
+        if self.calibrator.update(eye_aspect_ratio, timestamp):
+            thresholds = self.calibrator.thresholds()
+            self.set_thresholds(**thresholds)
+            print(f"EAR baseline calibrated: {self.calibrator.baseline:.3f} "
+                  f"(closed < {thresholds['eye_aspect_ratio_threshold']:.3f}, "
+                  f"normal <= {thresholds['normal_ear_threshold']:.3f}, "
+                  f"extreme <= {thresholds['extreme_ear_threshold']:.3f})")
+    
+    def _record_closure(self, timestamp, is_closed):
+        """Add one sample to the closure window and evict samples that left it"""
+        if self.last_sample_time is None:
+            duration = 0.0
+        else:
+            duration = min(max(0.0, timestamp - self.last_sample_time), self.max_sample_duration)
+        self.last_sample_time = timestamp
+        
+        self.eye_closure_history.append((timestamp, duration, is_closed))
+        self.window_duration += duration
+        if is_closed:
+            self.closed_duration += duration
+        
+        # Drop samples that ended before the start of the window
+        window_start = timestamp - self.closure_window
+        while len(self.eye_closure_history) > 1 and self.eye_closure_history[0][0] <= window_start:
+            _, old_duration, old_closed = self.eye_closure_history.popleft()
+            self.window_duration -= old_duration
+            if old_closed:
+                self.closed_duration -= old_duration
+        
+        if len(self.eye_closure_history) == 1:
+            # Resynchronize the running sums to avoid floating point drift
+            self.window_duration = duration
+            self.closed_duration = duration if is_closed else 0.0
+    
     def _calculate_eye_closure_percentage(self):
-        """Calculate percentage of recent frames where eyes were considered closed"""
+        """Calculate percentage of the recent time window where eyes were considered closed"""
         if not self.eye_closure_history:
             return 0
         
-        closed_count = sum(1 for is_closed in self.eye_closure_history if is_closed)
-        return (closed_count / len(self.eye_closure_history)) * 100
+        # The oldest sample may straddle the start of the window; count only its overlap
+        oldest_time, oldest_duration, oldest_closed = self.eye_closure_history[0]
+        overhang = max(0.0, (self.last_sample_time - self.closure_window) - (oldest_time - oldest_duration))
+        window_duration = self.window_duration - overhang
+        closed_duration = self.closed_duration - (overhang if oldest_closed else 0.0)
+        
+        if window_duration <= 1e-9:
+            return 0
+        
+        return min(100.0, max(0.0, closed_duration / window_duration * 100))
     
-    def detect(self, eye_aspect_ratio):
+    def detect(self, eye_aspect_ratio, timestamp=None):
         """
         Detect drowsiness based on eye aspect ratio
         
         Args:
             eye_aspect_ratio (float): Current eye aspect ratio
-            
+            timestamp (float): Time of the sample in seconds (defaults to the detector's clock;
+                               replay passes the source's frame time)
+        
         Returns:
             str: Drowsiness level - "AWAKE", "NORMAL", or "EXTREME"
         """
+        if timestamp is None:
+            timestamp = self.clock()
+        
         # Update eye closure history
         is_closed = eye_aspect_ratio < self.eye_aspect_ratio_threshold
-        self.eye_closure_history.append(is_closed)
-        
-        # Keep history at fixed size
-        if len(self.eye_closure_history) > self.history_size:
-            self.eye_closure_history.pop(0)
+        self._record_closure(timestamp, is_closed)
+        self.blink_features.update(eye_aspect_ratio, timestamp)
         
-        # Calculate closure percentage over recent frames
+        # Calculate closure percentage over the recent time window
         closure_percentage = self._calculate_eye_closure_percentage()
+        self.closure_percentage = closure_percentage
+        
+        level = self._update_level(eye_aspect_ratio, is_closed, closure_percentage, timestamp)
+        
+        if self.calibrator is not None and not self.calibrator.calibrated:
+            self._calibrate(eye_aspect_ratio, timestamp)
+        
+        return level
+    
+    def detect_many(self, ears, timestamps):
+        """
+        Run the drowsiness state machine over a batch of EAR samples
+        
+        Equivalent to calling detect() once per sample, but the duration-weighted
+        closure percentages are computed with vectorized NumPy operations.
+        
+        Args:
+            ears (numpy.ndarray): Eye aspect ratios, one per sample
+            timestamps (numpy.ndarray): Non-decreasing sample times in seconds, same length as ears
+        
+        Returns:
+            numpy.ndarray: Drowsiness level per sample
+        """
+        ears = np.asarray(ears, dtype=np.float64).ravel()
+        timestamps = np.asarray(timestamps, dtype=np.float64).ravel()
+        if ears.shape != timestamps.shape:
+            raise ValueError("ears and timestamps must have the same length")
+        
+        levels = np.empty(len(ears), dtype="<U7")
+        if len(ears) == 0:
+            return levels
+        
+        # Thresholds can change during calibration; step sample by sample until it completes
+        if self.calibrator is not None and not self.calibrator.calibrated:
+            for i in range(len(ears)):
+                levels[i] = self.detect(ears[i], timestamps[i])
+                if self.calibrator.calibrated:
+                    levels[i + 1:] = self.detect_many(ears[i + 1:], timestamps[i + 1:])
+                    break
+            return levels
+        
+        # Closed/open per sample and the time each sample covers, appended to the current window
+        is_closed = ears < self.eye_aspect_ratio_threshold
+        previous = self.last_sample_time if self.last_sample_time is not None else timestamps[0]
+        durations = np.clip(np.diff(timestamps, prepend=previous), 0.0, self.max_sample_duration)
         
+        prior_count = len(self.eye_closure_history)
+        if prior_count:
+            prior_times, prior_durations, prior_closed = (np.array(column) for column in
+                                                           zip(*self.eye_closure_history))
+        else:
+            prior_times = prior_durations = np.empty(0)
+            prior_closed = np.empty(0, dtype=bool)
+        sample_times = np.concatenate((prior_times, timestamps))
+        sample_durations = np.concatenate((prior_durations, durations))
+        sample_closed = np.concatenate((prior_closed, is_closed)).astype(bool)
+        
+        # Duration-weighted window sums from prefix sums
+        total_cumulative = np.concatenate(([0.0], np.cumsum(sample_durations)))
+        closed_cumulative = np.concatenate(([0.0], np.cumsum(sample_durations * sample_closed)))
+        ends = np.arange(prior_count, len(sample_times))
+        window_starts = sample_times[ends] - self.closure_window
+        firsts = np.minimum(np.searchsorted(sample_times, window_starts, side="right"), ends)
+        
+        # Trim the part of each window's oldest sample that lies before the window start
+        overhang = np.maximum(0.0, window_starts - (sample_times[firsts] - sample_durations[firsts]))
+        window_durations = total_cumulative[ends + 1] - total_cumulative[firsts] - overhang
+        closed_durations = (closed_cumulative[ends + 1] - closed_cumulative[firsts]
+                            - overhang * sample_closed[firsts])
+        closure_percentages = np.where(
+            window_durations > 1e-9,
+            np.clip(closed_durations / np.maximum(window_durations, 1e-9) * 100, 0.0, 100.0),
+            0.0)
+        
+        for i in range(len(ears)):
+            self.blink_features.update(ears[i], timestamps[i])
+            levels[i] = self._update_level(ears[i], is_closed[i], closure_percentages[i], timestamps[i])
+        
+        # Leave the window as if every sample had gone through detect()
+        keep = firsts[-1]
+        self.eye_closure_history = deque(zip(sample_times[keep:].tolist(),
+                                             sample_durations[keep:].tolist(),
+                                             sample_closed[keep:].tolist()))
+        self.window_duration = float(sample_durations[keep:].sum())
+        self.closed_duration = float((sample_durations[keep:] * sample_closed[keep:]).sum())
+        self.last_sample_time = float(timestamps[-1])
+        self.closure_percentage = float(closure_percentages[-1])
+        
+        return levels
+    
+    def _update_level(self, eye_aspect_ratio, is_closed, closure_percentage, timestamp):
+        """
+        Advance the drowsiness state machine by one sample
+        
+        Args:
+            eye_aspect_ratio (float): Eye aspect ratio of the sample
+            is_closed (bool): Whether the eyes are considered closed
+            closure_percentage (float): Closure percentage over the history window
+            timestamp (float): Time of the sample in seconds
+        
+        Returns:
+            str: Drowsiness level - "AWAKE", "NORMAL", or "EXTREME"
+        """
         # Check if eyes are closed based on EAR
         if is_closed:
             # Increment counter for consecutive frames with closed eyes
@@ -76,16 +302,16 @@ class DrowsinessDetector:
             
             # Start timer if not already started
             if self.drowsy_start_time is None:
-                self.drowsy_start_time = time.time()
-                
+                self.drowsy_start_time = timestamp
+            
             # Calculate drowsiness duration
-            drowsiness_duration = time.time() - self.drowsy_start_time
+            drowsiness_duration = timestamp - self.drowsy_start_time
             
             # Determine drowsiness level based on duration, EAR, and closure pattern
-            if (eye_aspect_ratio <= self.extreme_ear_threshold and 
+            if (eye_aspect_ratio <= self.extreme_ear_threshold and
                 drowsiness_duration >= self.extreme_duration_threshold) or closure_percentage > 70:
                 self.current_drowsiness_level = "EXTREME"
-            elif (eye_aspect_ratio <= self.normal_ear_threshold and 
+            elif (eye_aspect_ratio <= self.normal_ear_threshold and
                   drowsiness_duration >= self.normal_duration_threshold) or closure_percentage > 50:
                 self.current_drowsiness_level = "NORMAL"
             else:
@@ -100,10 +326,15 @@ class DrowsinessDetector:
                 # Downgrade from EXTREME to NORMAL if eyes are opening but still concerning
                 if self.current_drowsiness_level == "EXTREME":
                     self.current_drowsiness_level = "NORMAL"
+            elif (self.microsleep_alert_count and
+                  self.blink_features.microsleep_count >= self.microsleep_alert_count):
+                # Repeated microsleeps: hold at least NORMAL while they are recent
+                if self.current_drowsiness_level == "AWAKE":
+                    self.current_drowsiness_level = "NORMAL"
             else:
                 # Reset counter and timer if eyes are consistently open
                 self.closed_eyes_frames = 0
                 self.drowsy_start_time = None
                 self.current_drowsiness_level = "AWAKE"
         
-        return self.current_drowsiness_level
\ No newline at end of file
+        return self.current_drowsiness_level
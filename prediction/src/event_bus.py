@@ -0,0 +1,88 @@
+"""
+Change-only event bus from the detection process to the server
+
+Events (drowsiness status transitions, assistant responses) are sent as one JSON
+object per line over a Unix stream socket the FastAPI server listens on; the
+server pushes them to its SSE clients. The latest event of each retained type is
+re-sent whenever the connection is (re)established, so a restarted server
+immediately learns the current state.
+"""
+
+import json
+import socket
+import threading
+
+DEFAULT_EVENT_SOCKET_PATH = "/tmp/nocturne_events.sock"
+
+class EventPublisher(threading.Thread):
+    """
+    Thread that keeps a connection to the server's event socket and sends events on it
+    """
+
+    def __init__(self, socket_path=DEFAULT_EVENT_SOCKET_PATH, reconnect_interval=1.0):
+        """
+        Initialize the publisher
+
+        Args:
+            socket_path (str): Path of the server's Unix stream socket
+            reconnect_interval (float): Seconds between connection attempts while disconnected
+        """
+        super().__init__(daemon=True)
+        self.socket_path = socket_path
+        self.reconnect_interval = reconnect_interval
+        self.sock = None
+        self.retained = {}
+        self._lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self):
+        """Reconnect whenever the server is not connected, until stopped"""
+        while True:
+            with self._lock:
+                if self.sock is None:
+                    self._connect()
+            if self.stopped.wait(self.reconnect_interval):
+                break
+
+    def _connect(self):
+        """Connect and replay the retained events (called with the lock held)"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            return
+        self.sock = sock
+        for event in self.retained.values():
+            self._send(event)
+
+    def _send(self, event):
+        """Send one event, dropping the connection on error (called with the lock held)"""
+        if self.sock is None:
+            return
+        try:
+            self.sock.sendall(json.dumps(event).encode("utf-8") + b"\n")
+        except OSError:
+            self.sock.close()
+            self.sock = None
+
+    def publish(self, event, retain=True):
+        """
+        Send an event to the server
+
+        Args:
+            event (dict): JSON-serializable event with a "type" key
+            retain (bool): Keep it as the latest event of its type for replay on reconnect
+        """
+        with self._lock:
+            if retain:
+                self.retained[event["type"]] = event
+            self._send(event)
+
+    def stop(self):
+        """Stop reconnecting and close the connection"""
+        self.stopped.set()
+        with self._lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
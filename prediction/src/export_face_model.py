@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Driver Drowsiness Detection System - Export the res10 SSD face detector to ONNX
+
+Converts the Caffe res10 model to an ONNX model for the "onnxruntime" face detection
+backend and, given recorded frames to calibrate on, quantizes it to int8 for the
+"onnxruntime_int8" backend. The Caffe files are read directly (no Caffe or OpenCV
+Caffe importer is needed).
+
+The exported network stops before the SSD DetectionOutput layer: it returns the box
+offsets ("loc"), the face/background scores ("conf") and the prior boxes ("priors"),
+which the backend decodes into the same detection rows as the Caffe model.
+"""
+
+import argparse
+import os
+import re
+import sys
+import cv2
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+OPSET = 13
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Export the res10 SSD face detector to ONNX")
+    parser.add_argument("--proto", type=str, default=os.path.join(MODELS_DIR, "deploy.prototxt"),
+                        help="Caffe prototxt")
+    parser.add_argument("--model", type=str,
+                        default=os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel"),
+                        help="Caffe weights")
+    parser.add_argument("--output", type=str, default=os.path.join(MODELS_DIR, "res10_300x300_ssd.onnx"),
+                        help="ONNX model to write")
+    parser.add_argument("--int8-output", type=str,
+                        default=os.path.join(MODELS_DIR, "res10_300x300_ssd_int8.onnx"),
+                        help="int8-quantized ONNX model to write")
+    parser.add_argument("--calibration", type=str, default=None,
+                        help="Recorded video or image directory to calibrate the int8 model on "
+                             "(no int8 model is written if omitted)")
+    parser.add_argument("--frames", type=int, default=100,
+                        help="Number of calibration frames")
+    return parser.parse_args()
+
+# --- Caffe prototxt (protobuf text format) ---
+
+def parse_prototxt(text):
+    """
+    Parse a protobuf text file into nested dicts
+
+    Args:
+        text (str): File contents
+
+    Returns:
+        dict: Field name -> list of values (nested messages are dicts)
+    """
+    text = re.sub(r"#[^\n]*", "", text)
+    tokens = re.findall(r'"[^"]*"|[{}]|[^\s{}:"]+', text)
+    block, _ = _parse_block(tokens, 0)
+    return block
+
+def _parse_block(tokens, pos):
+    """Parse fields up to the closing brace of a message"""
+    block = {}
+    while pos < len(tokens) and tokens[pos] != "}":
+        key = tokens[pos]
+        if tokens[pos + 1] == "{":
+            value, pos = _parse_block(tokens, pos + 2)
+            pos += 1
+        else:
+            value, pos = _parse_value(tokens[pos + 1]), pos + 2
+        block.setdefault(key, []).append(value)
+    return block, pos
+
+def _parse_value(token):
+    """Convert a scalar token to str, int, float or bool"""
+    if token.startswith('"'):
+        return token[1:-1]
+    if token in ("true", "false"):
+        return token == "true"
+    for cast in (int, float):
+        try:
+            return cast(token)
+        except ValueError:
+            pass
+    return token
+
+def field(block, key, default=None):
+    """First value of a field, or the default if it is absent"""
+    values = block.get(key)
+    return values[0] if values else default
+
+# --- Caffe weights (protobuf binary format) ---
+
+def _read_varint(buf, pos):
+    """Decode a protobuf varint"""
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _fields(buf):
+    """Iterate over (field number, wire type, value) of a protobuf message"""
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 2:
+            length, pos = _read_varint(buf, pos)
+            value, pos = buf[pos:pos + length], pos + length
+        elif wire == 5:
+            value, pos = buf[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield number, wire, value
+
+def _read_blob(buf):
+    """Decode a Caffe BlobProto into a float32 array"""
+    data, shape, legacy_shape = [], [], {}
+    for number, wire, value in _fields(buf):
+        if number == 5:  # data (packed or repeated float)
+            data.append(np.frombuffer(bytes(value), dtype="<f4"))
+        elif number == 7:  # shape { dim }
+            for dim_number, dim_wire, dim in _fields(value):
+                if dim_number != 1:
+                    continue
+                if dim_wire == 2:
+                    pos = 0
+                    while pos < len(dim):
+                        size, pos = _read_varint(dim, pos)
+                        shape.append(size)
+                else:
+                    shape.append(dim)
+        elif number in (1, 2, 3, 4) and wire == 0:  # legacy num/channels/height/width
+            legacy_shape[number] = value
+    array = np.concatenate(data) if data else np.zeros(0, dtype=np.float32)
+    if not shape and legacy_shape:
+        shape = [legacy_shape.get(number, 1) for number in (1, 2, 3, 4)]
+    return array.reshape(shape) if shape else array
+
+def read_caffe_weights(path):
+    """
+    Read the weight blobs of every layer in a .caffemodel
+
+    Args:
+        path (str): Path of the Caffe weights
+
+    Returns:
+        dict: Layer name -> list of float32 arrays
+    """
+    with open(path, "rb") as f:
+        buf = memoryview(f.read())
+
+    weights = {}
+    for number, _, value in _fields(buf):
+        if number != 100:  # layer (LayerParameter)
+            continue
+        name, blobs = None, []
+        for layer_number, _, layer_value in _fields(value):
+            if layer_number == 1:
+                name = bytes(layer_value).decode("utf-8")
+            elif layer_number == 7:
+                blobs.append(_read_blob(layer_value))
+        if name is not None and blobs:
+            weights[name] = blobs
+    return weights
+
+# --- SSD prior boxes ---
+
+def prior_boxes(param, feature_size, image_size):
+    """
+    Compute the prior boxes of a Caffe PriorBox layer
+
+    Args:
+        param (dict): prior_box_param of the layer
+        feature_size (tuple): Feature map (height, width)
+        image_size (tuple): Network input (height, width)
+
+    Returns:
+        tuple: (boxes, variances) as (N, 4) arrays of normalized xmin, ymin, xmax, ymax
+    """
+    (fh, fw), (ih, iw) = feature_size, image_size
+    min_sizes = param.get("min_size", [])
+    max_sizes = param.get("max_size", [])
+    aspect_ratios = [1.0]
+    for ratio in param.get("aspect_ratio", []):
+        for value in ([ratio, 1.0 / ratio] if field(param, "flip", True) else [ratio]):
+            if all(abs(value - existing) > 1e-6 for existing in aspect_ratios):
+                aspect_ratios.append(value)
+    step_h = field(param, "step_h", field(param, "step", ih / fh))
+    step_w = field(param, "step_w", field(param, "step", iw / fw))
+    offset = field(param, "offset", 0.5)
+    variance = param.get("variance", [0.1])
+    if len(variance) == 1:
+        variance = variance * 4
+
+    # Box sizes per cell, in Caffe's order
+    sizes = []
+    for index, min_size in enumerate(min_sizes):
+        sizes.append((min_size, min_size))
+        if index < len(max_sizes):
+            size = np.sqrt(min_size * max_sizes[index])
+            sizes.append((size, size))
+        for ratio in aspect_ratios[1:]:
+            sizes.append((min_size * np.sqrt(ratio), min_size / np.sqrt(ratio)))
+    sizes = np.array(sizes, dtype=np.float32)
+
+    cy, cx = np.meshgrid((np.arange(fh) + offset) * step_h, (np.arange(fw) + offset) * step_w, indexing="ij")
+    centers = np.stack([cx.ravel(), cy.ravel()], axis=1)[:, None, :]
+    half = sizes[None, :, :] / 2
+    boxes = np.concatenate([(centers - half) / [iw, ih], (centers + half) / [iw, ih]], axis=2).reshape(-1, 4)
+    if field(param, "clip", False):
+        boxes = np.clip(boxes, 0.0, 1.0)
+    variances = np.tile(np.array(variance, dtype=np.float32), (len(boxes), 1))
+    return boxes.astype(np.float32), variances
+
+# --- ONNX graph ---
+
+class GraphBuilder:
+    """
+    Class that converts Caffe layers into ONNX nodes
+    """
+
+    def __init__(self, weights):
+        from onnx import helper, numpy_helper
+
+        self.helper = helper
+        self.numpy_helper = numpy_helper
+        self.weights = weights
+        self.nodes = []
+        self.initializers = []
+        # Caffe blob name -> current ONNX tensor name (Caffe layers may work in place).
+        # Tensors are named "<layer>/<part>" so they cannot clash with the "<tensor>_scale"
+        # style names the int8 quantizer adds (e.g. a Caffe layer called "data_scale")
+        self.tensors = {}
+
+    def constant(self, name, array, dtype=np.float32):
+        """Add an initializer and return its name"""
+        self.initializers.append(self.numpy_helper.from_array(np.ascontiguousarray(array, dtype=dtype), name))
+        return name
+
+    def node(self, op, inputs, output, **attributes):
+        """Add a node and return its output name"""
+        self.nodes.append(self.helper.make_node(op, inputs, [output], name=output, **attributes))
+        return output
+
+    def add_layer(self, layer):
+        """Convert one Caffe layer"""
+        name, kind = field(layer, "name"), field(layer, "type")
+        inputs = [self.tensors[bottom] for bottom in layer.get("bottom", [])]
+        blobs = self.weights.get(name, [])
+
+        if kind == "Convolution":
+            param = field(layer, "convolution_param", {})
+            kernel = field(param, "kernel_size", 1)
+            attributes = dict(kernel_shape=[kernel, kernel],
+                              strides=[field(param, "stride", 1)] * 2,
+                              pads=[field(param, "pad", 0)] * 4,
+                              dilations=[field(param, "dilation", 1)] * 2,
+                              group=field(param, "group", 1))
+            conv_inputs = [inputs[0], self.constant(name + "/W", blobs[0])]
+            if field(param, "bias_term", True):
+                conv_inputs.append(self.constant(name + "/B", blobs[1].ravel()))
+            output = self.node("Conv", conv_inputs, name + "/out", **attributes)
+        elif kind == "BatchNorm":
+            param = field(layer, "batch_norm_param", {})
+            factor = blobs[2].ravel()[0] if len(blobs) > 2 else 1.0
+            factor = 1.0 / factor if factor != 0 else 0.0
+            mean, var = blobs[0].ravel() * factor, blobs[1].ravel() * factor
+            scale = 1.0 / np.sqrt(var + field(param, "eps", 1e-5))
+            output = self._affine(name, inputs[0], scale, -mean * scale)
+        elif kind == "Scale":
+            param = field(layer, "scale_param", {})
+            bias = blobs[1].ravel() if field(param, "bias_term", False) else None
+            output = self._affine(name, inputs[0], blobs[0].ravel(), bias)
+        elif kind == "ReLU":
+            slope = field(field(layer, "relu_param", {}), "negative_slope", 0.0)
+            if slope:
+                output = self.node("LeakyRelu", inputs, name + "/out", alpha=float(slope))
+            else:
+                output = self.node("Relu", inputs, name + "/out")
+        elif kind == "Pooling":
+            param = field(layer, "pooling_param", {})
+            kernel = field(param, "kernel_size", 1)
+            attributes = dict(kernel_shape=[kernel, kernel],
+                              strides=[field(param, "stride", 1)] * 2,
+                              pads=[field(param, "pad", 0)] * 4,
+                              ceil_mode=1)  # Caffe rounds pooled sizes up
+            if field(param, "pool", "MAX") == "MAX":
+                output = self.node("MaxPool", inputs, name + "/out", **attributes)
+            else:
+                output = self.node("AveragePool", inputs, name + "/out", count_include_pad=1, **attributes)
+        elif kind == "Eltwise":
+            operation = field(field(layer, "eltwise_param", {}), "operation", "SUM")
+            if operation != "SUM":
+                raise ValueError(f"Unsupported Eltwise operation {operation} in {name}")
+            output = self.node("Sum", inputs, name + "/out")
+        elif kind == "Normalize":
+            param = field(layer, "norm_param", {})
+            if field(param, "across_spatial", True):
+                raise ValueError(f"Unsupported across_spatial normalization in {name}")
+            norm = self.node("ReduceL2", [inputs[0]], name + "/norm", axes=[1], keepdims=1)
+            norm = self.node("Add", [norm, self.constant(name + "/eps", np.array(field(param, "eps", 1e-10)))],
+                             name + "/norm_eps")
+            normalized = self.node("Div", [inputs[0], norm], name + "/div")
+            output = self.node("Mul", [normalized, self.constant(name + "/scale",
+                                                                 blobs[0].reshape(1, -1, 1, 1))], name + "/out")
+        elif kind == "Permute":
+            order = field(layer, "permute_param", {}).get("order", [])
+            output = self.node("Transpose", inputs, name + "/out", perm=order)
+        elif kind == "Flatten":
+            axis = field(field(layer, "flatten_param", {}), "axis", 1)
+            output = self.node("Flatten", inputs, name + "/out", axis=axis)
+        elif kind == "Concat":
+            axis = field(field(layer, "concat_param", {}), "axis", 1)
+            output = self.node("Concat", inputs, name + "/out", axis=axis)
+        elif kind == "Reshape":
+            dims = field(field(layer, "reshape_param", {}), "shape", {}).get("dim", [])
+            shape = self.constant(name + "/shape", dims, dtype=np.int64)
+            output = self.node("Reshape", [inputs[0], shape], name + "/out")
+        elif kind == "Softmax":
+            axis = field(field(layer, "softmax_param", {}), "axis", 1)
+            output = self.node("Softmax", inputs, name + "/out", axis=axis)
+        else:
+            raise ValueError(f"Unsupported layer type {kind} in {name}")
+
+        for top in layer.get("top", []):
+            self.tensors[top] = output
+
+    def _affine(self, name, tensor, scale, bias):
+        """Per-channel x * scale + bias"""
+        output = self.node("Mul", [tensor, self.constant(name + "/mul", scale.reshape(1, -1, 1, 1))],
+                           name + ("/out" if bias is None else "/scaled"))
+        if bias is not None:
+            output = self.node("Add", [output, self.constant(name + "/add", bias.reshape(1, -1, 1, 1))],
+                               name + "/out")
+        return output
+
+def export_onnx(proto_path, model_path, output_path):
+    """
+    Convert the Caffe SSD to ONNX
+
+    Args:
+        proto_path (str): Caffe prototxt
+        model_path (str): Caffe weights
+        output_path (str): ONNX model to write
+    """
+    import onnx
+    from onnx import helper, shape_inference, TensorProto
+
+    with open(proto_path, "r") as f:
+        net = parse_prototxt(f.read())
+    weights = read_caffe_weights(model_path)
+
+    input_name = field(net, "input", "data")
+    input_dims = field(net, "input_shape", {}).get("dim", [1, 3, 300, 300])
+    image_size = tuple(input_dims[2:4])
+
+    builder = GraphBuilder(weights)
+    builder.tensors[input_name] = input_name
+    layers = net.get("layer", [])
+    detection_layer = next(layer for layer in layers if field(layer, "type") == "DetectionOutput")
+    loc_blob, conf_blob, priors_blob = detection_layer["bottom"][:3]
+
+    # Prior boxes only depend on feature map sizes; they are computed at export time
+    prior_layers = []
+    for layer in layers:
+        kind = field(layer, "type")
+        if kind == "DetectionOutput" or field(layer, "top") == priors_blob:
+            continue
+        if kind == "PriorBox":
+            prior_layers.append(layer)
+            continue
+        builder.add_layer(layer)
+
+    # Feature map sizes of the prior box layers from ONNX shape inference
+    probe_outputs = [helper.make_tensor_value_info(builder.tensors[field(layer, "bottom")], TensorProto.FLOAT, None)
+                     for layer in prior_layers]
+    probe = helper.make_model(helper.make_graph(
+        builder.nodes, "probe",
+        [helper.make_tensor_value_info(input_name, TensorProto.FLOAT, input_dims)],
+        probe_outputs, builder.initializers),
+        opset_imports=[helper.make_opsetid("", OPSET)])
+    inferred = shape_inference.infer_shapes(probe)
+    shapes = {value.name: [dim.dim_value for dim in value.type.tensor_type.shape.dim]
+              for value in list(inferred.graph.value_info) + list(inferred.graph.output)}
+
+    boxes, variances = [], []
+    for layer in prior_layers:
+        feature_shape = shapes[builder.tensors[field(layer, "bottom")]]
+        layer_boxes, layer_variances = prior_boxes(field(layer, "prior_box_param", {}), feature_shape[2:4], image_size)
+        boxes.append(layer_boxes)
+        variances.append(layer_variances)
+    priors = np.stack([np.concatenate(boxes).ravel(), np.concatenate(variances).ravel()])
+    num_priors = priors.shape[1] // 4
+
+    builder.node("Identity", [builder.tensors[loc_blob]], "loc")
+    builder.node("Identity", [builder.tensors[conf_blob]], "conf")
+    builder.node("Identity", [builder.constant("priors_value", priors)], "priors")
+
+    graph = helper.make_graph(
+        builder.nodes, "res10_300x300_ssd",
+        [helper.make_tensor_value_info(input_name, TensorProto.FLOAT, ["N"] + list(input_dims[1:]))],
+        [helper.make_tensor_value_info("loc", TensorProto.FLOAT, ["N", num_priors * 4]),
+         helper.make_tensor_value_info("conf", TensorProto.FLOAT, ["N", num_priors * 2]),
+         helper.make_tensor_value_info("priors", TensorProto.FLOAT, list(priors.shape))],
+        builder.initializers)
+    # IR version 7 is the oldest that supports opset 13, so older onnxruntime builds load the model
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", OPSET)], ir_version=7,
+                              producer_name="nocturne-export-face-model")
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+    print(f"ONNX model written to {output_path} ({num_priors} prior boxes)")
+
+def read_frames(source, count):
+    """Read up to count frames from a video file or a directory of images (in name order)"""
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:count]:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    for _ in range(count):
+        ok, frame = capture.read()
+        if not ok:
+            break
+        yield frame
+    capture.release()
+
+class CalibrationReader:
+    """
+    Class that feeds recorded frames to the int8 calibration
+    """
+
+    def __init__(self, source, frames, input_name):
+        self.blobs = []
+        for frame in read_frames(source, frames):
+            # Same preprocessing as FaceDetector.make_blob
+            self.blobs.append(cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0, (300, 300),
+                                                    (104.0, 177.0, 123.0), swapRB=False, crop=False))
+        if not self.blobs:
+            raise ValueError(f"No calibration frames read from {source}")
+        self.input_name = input_name
+        self.index = 0
+
+    def get_next(self):
+        """Next calibration input (the onnxruntime CalibrationDataReader interface)"""
+        if self.index >= len(self.blobs):
+            return None
+        self.index += 1
+        return {self.input_name: self.blobs[self.index - 1]}
+
+def quantize_int8(input_path, output_path, calibration, frames=100):
+    """
+    Quantize the ONNX model to int8 with static (calibrated) quantization
+
+    Weight-only dynamic quantization is not offered: quantizing the activations of
+    every convolution at run time makes it slower than the float model.
+
+    Args:
+        input_path (str): Float ONNX model
+        output_path (str): int8 model to write
+        calibration (str): Recorded video or image directory with typical driving frames
+        frames (int): Number of calibration frames
+    """
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+
+    # Softmax, concatenation and the outputs stay in float for decoding
+    quantize_static(input_path, output_path, CalibrationReader(calibration, frames, "data"),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    op_types_to_quantize=["Conv", "MaxPool", "Relu", "Add", "Mul"])
+    print(f"int8 model written to {output_path}")
+
+def main():
+    """Export the face detector"""
+    args = parse_args()
+    for path in (args.proto, args.model):
+        if not os.path.isfile(path):
+            print(f"Error: {path} not found (run the application once to download the Caffe model)")
+            sys.exit(1)
+
+    required = [("onnx", "the export")] + ([("onnxruntime", "int8 quantization")] if args.calibration else [])
+    for module, purpose in required:
+        try:
+            __import__(module)
+        except ImportError:
+            print(f"Error: the {module} package is required for {purpose} (pip install {module})")
+            sys.exit(1)
+
+    export_onnx(args.proto, args.model, args.output)
+    if args.calibration:
+        quantize_int8(args.output, args.int8_output, args.calibration, args.frames)
+    else:
+        print("No --calibration frames given; int8 model not written")
+
+if __name__ == "__main__":
+    main()
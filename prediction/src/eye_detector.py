@@ -5,39 +5,90 @@ Eye detection and analysis module using dlib facial landmarks
 import dlib
 import numpy as np
 import cv2
-from scipy.spatial import distance as dist
+from itertools import chain
+
+
+def compute_eye_aspect_ratios(landmarks):
+    """
+    Calculate left and right eye aspect ratios for one or many sets of landmarks
+    
+    EAR = (||p2-p6|| + ||p3-p5||) / (2 * ||p1-p4||)
+    
+    Args:
+        landmarks (numpy.ndarray): Landmarks of shape (68, 2) or (12, 2) for a single
+                                   face, or (N, 68, 2) / (N, 12, 2) for N faces or frames
+        
+    Returns:
+        tuple: Left and right eye aspect ratios (floats for a single face,
+               arrays of shape (N,) for a batch)
+    """
+    points = np.asarray(landmarks, dtype=np.float64)
+    single = points.ndim == 2
+    if single:
+        points = points[np.newaxis]
+    
+    # Eye points are 36-47 in the full model, or the whole compact array
+    offset = 36 if points.shape[1] == 68 else 0
+    eyes = points[:, offset:offset + 12].reshape(points.shape[0], 2, 6, 2)
+    
+    # Vertical distances (p2-p6, p3-p5) and horizontal distance (p1-p4) for both eyes at once
+    A = np.linalg.norm(eyes[:, :, 1] - eyes[:, :, 5], axis=-1)
+    B = np.linalg.norm(eyes[:, :, 2] - eyes[:, :, 4], axis=-1)
+    C = np.linalg.norm(eyes[:, :, 0] - eyes[:, :, 3], axis=-1)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ear = (A + B) / (2.0 * C)
+    
+    if single:
+        return float(ear[0, 0]), float(ear[0, 1])
+    return ear[:, 0], ear[:, 1]
+
 
 class EyeDetector:
     """
     Class to detect eyes and calculate eye aspect ratio (EAR) using facial landmarks
     """
     
-    def __init__(self, landmarks_model):
+    # Indices of the eye landmarks (left eye then right eye) in the 68-point model
+    EYE_LANDMARK_INDICES = list(range(36, 48))
+    
+    def __init__(self, landmarks_model, eye_only=False):
         """
         Initialize the eye detector
         
         Args:
             landmarks_model (str): Path to the facial landmarks predictor model
+            eye_only (bool): Return only the 12 eye landmarks (indices 36-47) from detect()
         """
+        self.eye_only = eye_only
+        
         # Initialize dlib's face detector and facial landmark predictor
         self.detector = dlib.get_frontal_face_detector()
         self.predictor = dlib.shape_predictor(landmarks_model)
         
         # Define indices of facial landmarks for the left and right eyes
         # Based on the 68-point facial landmark detector
-        self.LEFT_EYE_INDICES = [36, 37, 38, 39, 40, 41]
-        self.RIGHT_EYE_INDICES = [42, 43, 44, 45, 46, 47]
+        # (positions 0-5 and 6-11 of the compact array in eye-only mode)
+        if eye_only:
+            self.LEFT_EYE_INDICES = [0, 1, 2, 3, 4, 5]
+            self.RIGHT_EYE_INDICES = [6, 7, 8, 9, 10, 11]
+        else:
+            self.LEFT_EYE_INDICES = [36, 37, 38, 39, 40, 41]
+            self.RIGHT_EYE_INDICES = [42, 43, 44, 45, 46, 47]
+        self.num_landmarks = 12 if eye_only else 68
     
-    def detect(self, frame, face_rect):
+    def detect(self, frame, face_rect, out=None):
         """
         Detect facial landmarks
         
         Args:
             frame (numpy.ndarray): Input image
             face_rect (list): Face bounding box [x, y, width, height]
+            out (numpy.ndarray): Optional preallocated int32 array of shape
+                                 (num_landmarks, 2) to write the landmarks into
             
         Returns:
-            numpy.ndarray: Detected facial landmarks
+            numpy.ndarray: Detected facial landmarks, shape (68, 2) or (12, 2) in eye-only mode
         """
         # Convert OpenCV rectangle to dlib rectangle
         x, y, w, h = face_rect
@@ -46,12 +97,31 @@ class EyeDetector:
         # Get facial landmarks
         shape = self.predictor(frame, dlib_rect)
         
-        # Convert landmarks to numpy array
-        landmarks = np.zeros((68, 2), dtype=np.int32)
-        for i in range(0, 68):
-            landmarks[i] = (shape.part(i).x, shape.part(i).y)
+        return self.shape_to_array(shape, out)
+    
+    def shape_to_array(self, shape, out=None):
+        """
+        Convert a dlib shape to a NumPy array of landmark coordinates
         
-        return landmarks
+        Args:
+            shape (dlib.full_object_detection): Landmarks returned by the shape predictor
+            out (numpy.ndarray): Optional preallocated int32 array of shape (num_landmarks, 2)
+            
+        Returns:
+            numpy.ndarray: Landmarks, shape (68, 2) or (12, 2) in eye-only mode
+        """
+        # Convert landmarks to numpy array in a single pass over the points
+        if self.eye_only:
+            points = [shape.part(i) for i in self.EYE_LANDMARK_INDICES]
+        else:
+            points = shape.parts()
+        coords = np.fromiter(chain.from_iterable((p.x, p.y) for p in points),
+                             dtype=np.int32, count=2 * self.num_landmarks)
+        
+        if out is None:
+            return coords.reshape(self.num_landmarks, 2)
+        out[:] = coords.reshape(self.num_landmarks, 2)
+        return out
     
     def calculate_eye_aspect_ratio(self, landmarks):
         """
@@ -66,41 +136,7 @@ class EyeDetector:
         Returns:
             tuple: Left and right eye aspect ratios
         """
-        # Get coordinates of left eye landmarks
-        left_eye = landmarks[self.LEFT_EYE_INDICES]
-        
-        # Get coordinates of right eye landmarks
-        right_eye = landmarks[self.RIGHT_EYE_INDICES]
-        
-        # Calculate eye aspect ratio for left eye
-        left_ear = self._calculate_ear(left_eye)
-        
-        # Calculate eye aspect ratio for right eye
-        right_ear = self._calculate_ear(right_eye)
-        
-        return left_ear, right_ear
-    
-    def _calculate_ear(self, eye):
-        """
-        Calculate the eye aspect ratio for a single eye
-        
-        Args:
-            eye (numpy.ndarray): Eye landmarks
-            
-        Returns:
-            float: Eye aspect ratio
-        """
-        # Calculate euclidean distance between horizontal eye landmarks
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
-        
-        # Calculate euclidean distance between vertical eye landmarks
-        C = dist.euclidean(eye[0], eye[3])
-        
-        # Calculate eye aspect ratio
-        ear = (A + B) / (2.0 * C)
-        
-        return ear
+        return compute_eye_aspect_ratios(landmarks)
     
     def draw_eyes(self, frame, landmarks):
         """
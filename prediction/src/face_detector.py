@@ -6,20 +6,56 @@ import cv2
 import numpy as np
 import os
 
+from src.inference_backends import create_face_backend
+
 class FaceDetector:
     """
     Class to detect faces in images using OpenCV's DNN module with a 
     pre-trained Caffe model for face detection.
     """
     
-    def __init__(self, confidence_threshold=0.5):
+    def __init__(self, confidence_threshold=0.5, detection_interval=1, tracker="landmarks",
+                 max_box_change=0.3, search_window=False, search_margin=0.75,
+                 nms_threshold=0.0, max_faces=0, backend_config=None):
         """
         Initialize the face detector
         
         Args:
             confidence_threshold (float): Minimum confidence to consider a detection valid
+            detection_interval (int): Run the DNN every N frames and track faces in between
+                                      (1 runs the DNN on every frame)
+            tracker (str): How faces are carried between detections - "landmarks" uses the
+                           landmarks passed to update_track(), or an OpenCV tracker name
+                           ("kcf", "csrt", "mil", "mosse")
+            max_box_change (float): Maximum relative change in tracked box size or position
+                                    between frames before a re-detection is forced
+            search_window (bool): Scan only a window around the last known face and fall
+                                  back to a full-frame scan after a miss
+            search_margin (float): Margin added on each side of the last face, as a
+                                   fraction of the face size
+            nms_threshold (float): IoU threshold for non-maximum suppression (0 disables it)
+            max_faces (int): Keep only the N most confident faces (0 keeps all)
+            backend_config (dict): Inference backend settings (detection.backend in config.yaml);
+                                   defaults to OpenCV DNN on the Caffe model
         """
         self.confidence_threshold = confidence_threshold
+        self.detection_interval = max(1, int(detection_interval))
+        self.tracker = tracker.lower()
+        self.max_box_change = max_box_change
+        self.search_window = search_window
+        self.search_margin = search_margin
+        self.nms_threshold = nms_threshold
+        self.max_faces = max_faces
+        self.last_face = None
+        
+        # Confidences of the faces returned by the last detect()/detect_batch() call
+        self.last_confidences = []
+        self.last_batch_confidences = []
+        
+        # Tracking state
+        self.tracked_faces = []
+        self.frames_since_detection = 0
+        self.force_detection = True
         
         # Load the model
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -30,8 +66,9 @@ class FaceDetector:
         if not os.path.exists(proto_path) or not os.path.exists(model_path):
             self._download_model(proto_path, model_path)
         
-        # Load face detection model
-        self.face_net = cv2.dnn.readNet(proto_path, model_path)
+        # Load face detection model on the configured backend (runs a warmup inference)
+        self.backend = create_face_backend(backend_config, proto_path, model_path,
+                                           os.path.join(current_dir, "..", "models"))
         
     def _download_model(self, proto_path, model_path):
         """Download face detection model files if they don't exist"""
@@ -47,7 +84,181 @@ class FaceDetector:
     
     def detect(self, frame):
         """
-        Detect faces in a frame
+        Detect faces in a frame, running the DNN only when tracking cannot carry them forward
+        
+        Args:
+            frame (numpy.ndarray): Input image
+            
+        Returns:
+            list: List of detected face bounding boxes [x, y, width, height]
+                  (confidences are kept in last_confidences)
+        """
+        if self.detection_interval > 1 and not self._needs_detection():
+            faces = self._track(frame)
+            if faces is not None:
+                self.frames_since_detection += 1
+                return faces
+        
+        faces = self._detect_dnn(frame)
+        self._start_tracking(frame, faces)
+        return faces
+    
+    def update_track(self, face_index, landmarks):
+        """
+        Carry a tracked face forward using its latest facial landmarks
+        
+        Args:
+            face_index (int): Index of the face in the list returned by detect()
+            landmarks (numpy.ndarray): Landmarks detected for that face
+        """
+        if self.tracker != "landmarks" or face_index >= len(self.tracked_faces):
+            return
+        
+        track = self.tracked_faces[face_index]
+        cx, cy, lw = self._landmarks_anchor(landmarks)
+        if lw <= 0:
+            self.force_detection = True
+            return
+        
+        # First landmarks after a detection fix the box geometry relative to the landmarks.
+        # Only the landmark width is used as scale, so closing eyes do not shrink the box.
+        if track["offset"] is None:
+            x, y, w, h = track["box"]
+            track["offset"] = ((x - cx) / lw, (y - cy) / lw, w / lw, h / lw)
+        
+        ox, oy, sw, sh = track["offset"]
+        new_box = [int(cx + ox * lw), int(cy + oy * lw), int(sw * lw), int(sh * lw)]
+        
+        if self._box_change(track["box"], new_box) > self.max_box_change:
+            # Landmarks jumped too far; tracking confidence has dropped
+            self.force_detection = True
+            return
+        
+        track["box"] = new_box
+        track["updated"] = True
+    
+    def keep_faces(self, faces, indices):
+        """
+        Restrict the detection results and tracking to a subset of the faces
+        
+        Args:
+            faces (list): Face bounding boxes returned by detect()
+            indices (list): Indices of the faces to keep
+            
+        Returns:
+            list: The kept face bounding boxes
+        """
+        kept = [faces[i] for i in indices]
+        self.last_confidences = [self.last_confidences[i] for i in indices
+                                 if i < len(self.last_confidences)]
+        if len(self.tracked_faces) == len(faces):
+            self.tracked_faces = [self.tracked_faces[i] for i in indices]
+        if kept:
+            # Centre the next search window on the kept face
+            self.last_face = max(kept, key=lambda face: face[2] * face[3])
+        return kept
+    
+    def reset_tracking(self):
+        """Drop all tracked faces so the next call to detect() runs the DNN"""
+        self.tracked_faces = []
+        self.force_detection = True
+    
+    def _needs_detection(self):
+        """Check whether a DNN re-detection is due"""
+        if self.force_detection or not self.tracked_faces:
+            return True
+        if self.frames_since_detection + 1 >= self.detection_interval:
+            return True
+        # Landmark tracking needs every tracked face to have been updated since the last frame
+        if self.tracker == "landmarks":
+            return not all(track["updated"] for track in self.tracked_faces)
+        return False
+    
+    def _start_tracking(self, frame, faces):
+        """Reset tracking state from a fresh set of DNN detections"""
+        self.frames_since_detection = 0
+        self.force_detection = False
+        self.tracked_faces = []
+        if self.detection_interval <= 1:
+            return
+        
+        for face, confidence in zip(faces, self.last_confidences):
+            track = {"box": list(face), "confidence": confidence, "offset": None,
+                     "updated": False, "cv_tracker": None}
+            if self.tracker != "landmarks":
+                cv_tracker = self._create_cv_tracker()
+                if cv_tracker is None:
+                    self.tracked_faces = []
+                    return
+                cv_tracker.init(frame, tuple(int(v) for v in face))
+                track["cv_tracker"] = cv_tracker
+            self.tracked_faces.append(track)
+    
+    def _track(self, frame):
+        """
+        Carry tracked faces forward to the current frame
+        
+        Returns:
+            list: Tracked face boxes, or None if tracking failed and a re-detection is needed
+        """
+        (h, w) = frame.shape[:2]
+        faces = []
+        for track in self.tracked_faces:
+            if track["cv_tracker"] is not None:
+                ok, box = track["cv_tracker"].update(frame)
+                box = [int(v) for v in box]
+                if not ok or self._box_change(track["box"], box) > self.max_box_change:
+                    return None
+                track["box"] = box
+            
+            track["updated"] = False
+            x, y, bw, bh = track["box"]
+            
+            # Clip to frame; a face that has mostly left the frame needs a re-detection
+            startX, startY = max(0, x), max(0, y)
+            endX, endY = min(w, x + bw), min(h, y + bh)
+            if (endX - startX) * (endY - startY) < 0.5 * bw * bh:
+                return None
+            faces.append([startX, startY, endX - startX, endY - startY])
+        
+        self.last_confidences = [track["confidence"] for track in self.tracked_faces]
+        return faces
+    
+    def _create_cv_tracker(self):
+        """Create an OpenCV tracker by name, looking in cv2 and cv2.legacy"""
+        name = f"Tracker{self.tracker.upper()}_create"
+        for module in (cv2, getattr(cv2, "legacy", None)):
+            factory = getattr(module, name, None) if module is not None else None
+            if factory is not None:
+                return factory()
+        print(f"Warning: OpenCV tracker '{self.tracker}' not available, running DNN every frame")
+        self.detection_interval = 1
+        return None
+    
+    @staticmethod
+    def _landmarks_anchor(landmarks):
+        """Center (x, y) and horizontal extent of a set of landmarks"""
+        min_xy = landmarks.min(axis=0)
+        max_xy = landmarks.max(axis=0)
+        return ((float(min_xy[0]) + float(max_xy[0])) / 2.0, (float(min_xy[1]) + float(max_xy[1])) / 2.0,
+                float(max_xy[0] - min_xy[0]))
+    
+    @staticmethod
+    def _box_change(old_box, new_box):
+        """Relative change in position and size between two boxes"""
+        ox, oy, ow, oh = old_box
+        nx, ny, nw, nh = new_box
+        scale = float(max(ow, oh, 1))
+        shift = max(abs((nx + nw / 2.0) - (ox + ow / 2.0)), abs((ny + nh / 2.0) - (oy + oh / 2.0))) / scale
+        resize = max(abs(nw - ow) / float(max(ow, 1)), abs(nh - oh) / float(max(oh, 1)))
+        return max(shift, resize)
+    
+    def _detect_dnn(self, frame):
+        """
+        Detect faces in a frame with the SSD face detector
+        
+        When the search window is enabled and a face was found last time, only a
+        window around that face is scanned; a miss falls back to a full-frame scan.
         
         Args:
             frame (numpy.ndarray): Input image
@@ -58,46 +269,187 @@ class FaceDetector:
         # Get frame dimensions
         (h, w) = frame.shape[:2]
         
-        # Create a blob from the frame
-        blob = cv2.dnn.blobFromImage(
-            cv2.resize(frame, (300, 300)), 1.0, (300, 300),
-            (104.0, 177.0, 123.0), swapRB=False, crop=False
-        )
+        if self.search_window and self.last_face is not None:
+            region = self._search_region(self.last_face, w, h)
+            if region is not None:
+                faces = self._detect_in_region(frame, region)
+                if faces:
+                    self.last_face = max(faces, key=lambda face: face[2] * face[3])
+                    return faces
         
-        # Pass the blob through the network
-        self.face_net.setInput(blob)
-        detections = self.face_net.forward()
+        # Full-frame scan
+        faces = self._detect_in_region(frame, (0, 0, w, h))
+        self.last_face = max(faces, key=lambda face: face[2] * face[3]) if faces else None
+        return faces
+    
+    def _search_region(self, face, frame_w, frame_h):
+        """
+        Compute a square search window around a face, with margins, clipped to the frame
         
-        # Process detections
-        faces = []
-        for i in range(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
+        Returns:
+            tuple: Region (x, y, width, height), or None if it would cover most of the frame
+        """
+        x, y, fw, fh = face
+        side = int(max(fw, fh) * (1.0 + 2.0 * self.search_margin))
+        side = min(side, frame_w, frame_h)
+        
+        # Center the window on the face and shift it back inside the frame
+        cx, cy = x + fw // 2, y + fh // 2
+        x0 = min(max(0, cx - side // 2), frame_w - side)
+        y0 = min(max(0, cy - side // 2), frame_h - side)
+        
+        if side * side >= 0.75 * frame_w * frame_h:
+            return None
+        return x0, y0, side, side
+    
+    def _detect_in_region(self, frame, region):
+        """
+        Run the SSD on a region of the frame and map the boxes back to frame coordinates
+        
+        Args:
+            frame (numpy.ndarray): Input image
+            region (tuple): Region to scan (x, y, width, height)
             
-            # Filter out weak detections
-            if confidence < self.confidence_threshold:
-                continue
+        Returns:
+            list: List of detected face bounding boxes [x, y, width, height]
+        """
+        x0, y0, rw, rh = region
+        roi = frame[y0:y0 + rh, x0:x0 + rw]
+        
+        # Create a blob from the region
+        blob = self.make_blob(roi)
+        
+        # Pass the blob through the network
+        detections = self.backend.infer(blob)
+        
+        faces, self.last_confidences = self._process_detections(frame, detections[0, 0], region)
+        return faces
+    
+    def make_blob(self, image):
+        """
+        Resize an image to the network input size and convert it to a blob
+        
+        Args:
+            image (numpy.ndarray): Input image or region
             
-            # Compute bounding box
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            (startX, startY, endX, endY) = box.astype("int")
+        Returns:
+            numpy.ndarray: NCHW blob for the SSD
+        """
+        return cv2.dnn.blobFromImage(
+            cv2.resize(image, (300, 300)), 1.0, (300, 300),
+            (104.0, 177.0, 123.0), swapRB=False, crop=False
+        )
+    
+    def detect_batch(self, frames):
+        """
+        Detect faces in several frames (e.g. one per camera) with a single forward pass
+        
+        Args:
+            frames (list): List of input images
             
-            # Ensure the bounding box falls within the frame dimensions
-            startX = max(0, startX)
-            startY = max(0, startY)
-            endX = min(w, endX)
-            endY = min(h, endY)
+        Returns:
+            list: One list of face bounding boxes [x, y, width, height] per frame
+                  (confidences are kept in last_batch_confidences)
+        """
+        if not frames:
+            return []
+        
+        # Create one blob holding every frame
+        blob = cv2.dnn.blobFromImages(
+            [cv2.resize(frame, (300, 300)) for frame in frames], 1.0, (300, 300),
+            (104.0, 177.0, 123.0), swapRB=False, crop=False
+        )
+        
+        # Pass the batch through the network
+        detections = self.backend.infer(blob)[0, 0]
+        
+        # Split detections by the image index in column 0
+        results = []
+        self.last_batch_confidences = []
+        for index, frame in enumerate(frames):
+            (h, w) = frame.shape[:2]
+            frame_detections = detections[detections[:, 0] == index]
+            faces, confidences = self._process_detections(frame, frame_detections, (0, 0, w, h))
+            results.append(faces)
+            self.last_batch_confidences.append(confidences)
+        
+        return results
+    
+    def _process_detections(self, frame, detections, region):
+        """
+        Convert raw SSD detections for one image into face boxes in frame coordinates
+        
+        Filtering, scaling, clipping, NMS and top-k are done as array operations;
+        the frame is only used for its dimensions and is never modified.
+        
+        Args:
+            frame (numpy.ndarray): Input image the detections belong to
+            detections (numpy.ndarray): SSD output rows of shape (N, 7)
+            region (tuple): Region of the frame the network saw (x, y, width, height)
             
-            # Extract face region
-            face = [startX, startY, endX - startX, endY - startY]
-            faces.append(face)
+        Returns:
+            tuple: (list of face bounding boxes [x, y, width, height], list of confidences),
+                   sorted by decreasing confidence
+        """
+        (h, w) = frame.shape[:2]
+        x0, y0, rw, rh = region
+        
+        # Filter out weak detections
+        detections = detections[detections[:, 2] >= self.confidence_threshold]
+        if detections.shape[0] == 0:
+            return [], []
+        
+        # Sort by confidence
+        detections = detections[np.argsort(-detections[:, 2])]
+        confidences = detections[:, 2]
+        
+        # Scale to frame coordinates and clip to the frame dimensions
+        boxes = detections[:, 3:7] * np.array([rw, rh, rw, rh], dtype=np.float32)
+        boxes += np.array([x0, y0, x0, y0], dtype=np.float32)
+        boxes = boxes.astype(np.int32)
+        np.clip(boxes, 0, np.array([w, h, w, h], dtype=np.int32), out=boxes)
+        
+        # Convert to [x, y, width, height] and drop empty boxes
+        boxes[:, 2:] -= boxes[:, :2]
+        valid = (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+        boxes = boxes[valid]
+        confidences = confidences[valid]
+        
+        # Suppress overlapping boxes
+        if self.nms_threshold and boxes.shape[0] > 1:
+            keep = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(),
+                                    self.confidence_threshold, self.nms_threshold)
+            keep = np.sort(np.array(keep, dtype=np.int32).reshape(-1))
+            boxes = boxes[keep]
+            confidences = confidences[keep]
+        
+        # Keep only the most confident faces
+        if self.max_faces:
+            boxes = boxes[:self.max_faces]
+            confidences = confidences[:self.max_faces]
+        
+        return boxes.tolist(), confidences.tolist()
+    
+    def draw_faces(self, frame, faces, confidences=None):
+        """
+        Draw face bounding boxes and confidences on the frame
+        
+        Args:
+            frame (numpy.ndarray): Input image
+            faces (list): Face bounding boxes [x, y, width, height]
+            confidences (list): Detection confidences matching faces (optional)
             
+        Returns:
+            None (modifies frame in-place)
+        """
+        for i, (startX, startY, width, height) in enumerate(faces):
             # Draw bounding box
-            cv2.rectangle(frame, (startX, startY), (endX, endY), (0, 255, 0), 2)
+            cv2.rectangle(frame, (startX, startY), (startX + width, startY + height), (0, 255, 0), 2)
             
             # Display confidence
-            text = f"{confidence * 100:.2f}%"
+            if confidences is None or i >= len(confidences) or confidences[i] is None:
+                continue
+            text = f"{confidences[i] * 100:.2f}%"
             y = startY - 10 if startY - 10 > 10 else startY + 10
             cv2.putText(frame, text, (startX, y),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 0), 2)
-        
-        return faces
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Shared-memory frame bus from the detection process to the server's /video stream
+
+Processed frames are written into a memory-mapped ring of fixed-size slots, each
+tagged with a sequence number, so the server can stream them without opening the
+camera itself. The server marks that someone is watching by refreshing a viewer
+heartbeat in the header; frames are only published while that heartbeat is fresh.
+
+Layout (little endian), shared with server/frame_bus.py:
+    header (64 bytes): magic "NFB1", num_slots, height, width, channels (uint32),
+                       latest sequence (uint64), viewer heartbeat (float64 time.time())
+    slots: sequence (uint64), capture timestamp (float64), frame bytes
+"""
+
+import os
+import mmap
+import struct
+import time
+import numpy as np
+
+DEFAULT_FRAME_BUS_PATH = "/dev/shm/nocturne_frames" if os.path.isdir("/dev/shm") else "/tmp/nocturne_frames"
+
+MAGIC = b"NFB1"
+HEADER_FORMAT = "<4sIIIIQd"
+HEADER_SIZE = 64
+LATEST_SEQ_OFFSET = 20
+HEARTBEAT_OFFSET = 28
+SLOT_HEADER_FORMAT = "<Qd"
+SLOT_HEADER_SIZE = 16
+
+def slot_stride(frame_bytes):
+    """Bytes per slot, rounded up to a cache line"""
+    return (SLOT_HEADER_SIZE + frame_bytes + 63) // 64 * 64
+
+class FrameBusWriter:
+    """
+    Class to publish processed frames into the shared-memory ring
+    """
+
+    def __init__(self, frame_shape, path=DEFAULT_FRAME_BUS_PATH, num_slots=4, viewer_timeout=2.0):
+        """
+        Initialize the frame bus and create its backing file
+
+        Args:
+            frame_shape (tuple): Shape of the frames (height, width, channels)
+            path (str): Path of the memory-mapped file (on tmpfs where available)
+            num_slots (int): Number of frame slots in the ring
+            viewer_timeout (float): Seconds after the last heartbeat that a viewer is assumed gone
+        """
+        self.path = path
+        self.num_slots = max(2, int(num_slots))
+        self.viewer_timeout = viewer_timeout
+        self.mm = None
+        self.seq = 0
+        self._create(tuple(frame_shape))
+
+    def _create(self, frame_shape):
+        """Create (or recreate for a new frame size) the backing file and map it"""
+        self.close(unlink=False)
+        self.frame_shape = frame_shape
+        self.frame_bytes = int(np.prod(frame_shape))
+        self.stride = slot_stride(self.frame_bytes)
+        size = HEADER_SIZE + self.num_slots * self.stride
+
+        # Build the file under a temporary name so readers never map a half-initialized bus
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_CREAT | os.O_RDWR | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        height, width = frame_shape[:2]
+        channels = frame_shape[2] if len(frame_shape) > 2 else 1
+        struct.pack_into(HEADER_FORMAT, self.mm, 0, MAGIC, self.num_slots, height, width, channels, 0, 0.0)
+        os.replace(tmp_path, self.path)
+
+        self.slots = [np.ndarray(frame_shape, dtype=np.uint8, buffer=self.mm,
+                                 offset=HEADER_SIZE + i * self.stride + SLOT_HEADER_SIZE)
+                      for i in range(self.num_slots)]
+
+    def has_viewer(self):
+        """
+        Check whether the server is currently streaming frames
+
+        Returns:
+            bool: True if the viewer heartbeat is recent
+        """
+        if self.mm is None:
+            return False
+        heartbeat, = struct.unpack_from("<d", self.mm, HEARTBEAT_OFFSET)
+        return time.time() - heartbeat < self.viewer_timeout
+
+    def publish(self, frame, timestamp=None):
+        """
+        Copy a frame into the next slot and make it the latest
+
+        Args:
+            frame (numpy.ndarray): Processed (annotated) frame
+            timestamp (float): Capture timestamp (defaults to time.time())
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if frame.shape != self.frame_shape or frame.dtype != np.uint8:
+            self._create(frame.shape)
+
+        self.seq += 1
+        slot = self.seq % self.num_slots
+        offset = HEADER_SIZE + slot * self.stride
+
+        # Invalidate the slot while it is being overwritten; readers check the sequence
+        # before and after using a frame
+        struct.pack_into(SLOT_HEADER_FORMAT, self.mm, offset, 0, timestamp)
+        np.copyto(self.slots[slot], frame)
+        struct.pack_into(SLOT_HEADER_FORMAT, self.mm, offset, self.seq, timestamp)
+        struct.pack_into("<Q", self.mm, LATEST_SEQ_OFFSET, self.seq)
+
+    def close(self, unlink=True):
+        """
+        Unmap the bus
+
+        Args:
+            unlink (bool): Also remove the backing file
+        """
+        if self.mm is not None:
+            self.slots = []
+            self.mm.close()
+            self.mm = None
+        if unlink and os.path.exists(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,127 @@
+"""
+Adaptive processing rate governor for the drowsiness detection loop
+"""
+
+import math
+
+class ProcessingGovernor:
+    """
+    Class to lower the analysis rate while the driver is clearly alert.
+
+    The driver counts as clearly alert when the level is AWAKE, no recent eye
+    closures are recorded and the smoothed EAR has stayed well above the closed-eye
+    threshold for a while. Any closure, a falling EAR trend, a non-AWAKE level or a
+    lost face immediately returns the loop to full rate.
+    """
+
+    def __init__(self, eye_aspect_ratio_threshold, full_fps=30, min_fps=10, enabled=True,
+                 alert_ear_margin=0.05, stable_seconds=30.0, max_ear_drop=0.03):
+        """
+        Initialize the governor
+
+        Args:
+            eye_aspect_ratio_threshold (float): EAR below which eyes are considered closed
+            full_fps (float): Analysis rate when the driver is not clearly alert
+            min_fps (float): Lowest analysis rate, high enough that a slow blink is never missed
+            enabled (bool): Whether the rate is ever lowered
+            alert_ear_margin (float): Margin above the threshold the EAR must keep to count as alert
+            stable_seconds (float): How long the driver must stay clearly alert before slowing down
+            max_ear_drop (float): Drop of the short-term EAR below its long-term trend that
+                                  restores full rate
+        """
+        self.eye_aspect_ratio_threshold = eye_aspect_ratio_threshold
+        self.full_fps = full_fps
+        self.min_fps = min(min_fps, full_fps)
+        self.enabled = enabled
+        self.alert_ear_margin = alert_ear_margin
+        self.stable_seconds = stable_seconds
+        self.max_ear_drop = max_ear_drop
+
+        # Smoothed EAR with a short (0.5 s) and a long (10 s) time constant
+        self.fast_ear = None
+        self.slow_ear = None
+        self.last_update_time = None
+
+        self.alert_since = None
+        self.reduced = False
+        self.last_process_time = None
+
+    def update(self, timestamp, ear, drowsiness_level, closure_percentage):
+        """
+        Update the governor with the result of a processed frame
+
+        Args:
+            timestamp (float): Time the frame was processed
+            ear (float): Average eye aspect ratio, or None if no face was found
+            drowsiness_level (str): Current drowsiness level
+            closure_percentage (float): Percentage of the recent time window with closed eyes
+        """
+        self.last_process_time = timestamp
+
+        if ear is None:
+            self._full_rate()
+            self.last_update_time = None
+            return
+
+        # Time-based smoothing so the trend does not depend on the current rate
+        if self.last_update_time is None or self.fast_ear is None:
+            self.fast_ear = ear
+            self.slow_ear = ear
+        else:
+            dt = max(0.0, timestamp - self.last_update_time)
+            self.fast_ear += (1.0 - math.exp(-dt / 0.5)) * (ear - self.fast_ear)
+            self.slow_ear += (1.0 - math.exp(-dt / 10.0)) * (ear - self.slow_ear)
+        self.last_update_time = timestamp
+
+        clearly_alert = (
+            drowsiness_level == "AWAKE"
+            and closure_percentage == 0
+            and ear >= self.eye_aspect_ratio_threshold + self.alert_ear_margin
+            and self.slow_ear - self.fast_ear <= self.max_ear_drop
+        )
+
+        if not clearly_alert:
+            self._full_rate()
+            return
+
+        if self.alert_since is None:
+            self.alert_since = timestamp
+        if self.enabled and timestamp - self.alert_since >= self.stable_seconds:
+            if not self.reduced:
+                print(f"Driver clearly alert; lowering analysis rate to {self.min_fps:.0f} FPS")
+            self.reduced = True
+
+    def reset(self):
+        """Return to full rate and forget the EAR trend so a new drive starts from a clean state"""
+        self.fast_ear = None
+        self.slow_ear = None
+        self.last_update_time = None
+        self.alert_since = None
+        self.reduced = False
+        self.last_process_time = None
+
+    def _full_rate(self):
+        """Return to full rate immediately"""
+        if self.reduced:
+            print("Returning to full analysis rate")
+        self.reduced = False
+        self.alert_since = None
+
+    @property
+    def target_fps(self):
+        """Current analysis rate"""
+        return self.min_fps if self.reduced else self.full_fps
+
+    def next_frame_delay(self, now):
+        """
+        Get how long to wait before processing the next frame
+
+        Args:
+            now (float): Current time
+
+        Returns:
+            float: Seconds to wait (0 when the next frame is due)
+        """
+        if not self.reduced or self.last_process_time is None:
+            return 0.0
+        return max(0.0, self.last_process_time + 1.0 / self.target_fps - now)
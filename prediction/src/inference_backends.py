@@ -0,0 +1,281 @@
+"""
+Inference backends for the SSD face detector
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+
+class OpenCVDNNBackend:
+    """
+    Face detector inference with OpenCV's DNN module and a configurable backend/target
+    """
+
+    name = "opencv"
+
+    def __init__(self, proto_path, model_path, backend="default", target="cpu"):
+        """
+        Initialize the OpenCV DNN backend
+
+        Args:
+            proto_path (str): Path to the Caffe prototxt (None for single-file models such as ONNX)
+            model_path (str): Path to the model weights
+            backend (str): OpenCV DNN backend ("default", "opencv", "inference_engine", "vkcom", "cuda", ...)
+            target (str): OpenCV DNN target ("cpu", "opencl", "opencl_fp16", "vulkan", "cuda", ...)
+        """
+        if proto_path:
+            self.net = cv2.dnn.readNet(proto_path, model_path)
+        else:
+            self.net = cv2.dnn.readNet(model_path)
+
+        self.net.setPreferableBackend(self._lookup("DNN_BACKEND_", backend))
+        self.net.setPreferableTarget(self._lookup("DNN_TARGET_", target))
+
+        self.description = f"OpenCV DNN (backend={backend}, target={target})"
+        self.latency_ms = 0.0
+
+    @staticmethod
+    def _lookup(prefix, name):
+        """Map a backend/target name from the config to its cv2.dnn constant"""
+        constant = getattr(cv2.dnn, prefix + name.upper(), None)
+        if constant is None:
+            raise ValueError(f"Unknown OpenCV DNN setting: {prefix}{name.upper()}")
+        return constant
+
+    def infer(self, blob):
+        """
+        Run the network on a blob
+
+        Args:
+            blob (numpy.ndarray): NCHW input blob
+
+        Returns:
+            numpy.ndarray: SSD detections of shape (1, 1, N, 7)
+        """
+        start = time.perf_counter()
+        self.net.setInput(blob)
+        detections = self.net.forward()
+        _update_latency(self, start)
+        return detections
+
+
+class ONNXRuntimeBackend:
+    """
+    Face detector inference with ONNX Runtime on the CPU.
+
+    Runs the model written by export_face_model.py, whose "loc", "conf" and "priors"
+    outputs are decoded into SSD detection rows here; a model with a single output
+    must already produce rows in the (1, 1, N, 7) layout of the Caffe res10 model.
+    The same class runs the int8-quantized model.
+    """
+
+    name = "onnxruntime"
+
+    def __init__(self, model_path, num_threads=0, quantized=False):
+        """
+        Initialize the ONNX Runtime backend
+
+        Args:
+            model_path (str): Path to the ONNX model
+            num_threads (int): Intra-op thread count (0 lets ONNX Runtime decide)
+            quantized (bool): Whether the model is an int8-quantized variant
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("onnxruntime is not installed; install it or use the opencv backend")
+
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"ONNX face detection model not found at {model_path} "
+                                    "(create it with src/export_face_model.py)")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.decode = set(self.output_names) >= {"loc", "conf", "priors"}
+        self.priors = None
+
+        if quantized:
+            self.name = "onnxruntime_int8"
+        self.description = f"ONNX Runtime CPU{' int8' if quantized else ''} ({os.path.basename(model_path)})"
+        self.latency_ms = 0.0
+
+    def infer(self, blob):
+        """
+        Run the network on a blob
+
+        Args:
+            blob (numpy.ndarray): NCHW input blob
+
+        Returns:
+            numpy.ndarray: SSD detections of shape (1, 1, N, 7)
+        """
+        start = time.perf_counter()
+        blob = blob.astype(np.float32, copy=False)
+        if not self.decode:
+            detections = self.session.run(None, {self.input_name: blob})[0].reshape(1, 1, -1, 7)
+        else:
+            if self.priors is None:
+                loc, conf, self.priors = self.session.run(["loc", "conf", "priors"], {self.input_name: blob})
+            else:
+                loc, conf = self.session.run(["loc", "conf"], {self.input_name: blob})
+            detections = decode_ssd(loc, conf, self.priors)
+        _update_latency(self, start)
+        return detections
+
+
+def decode_ssd(loc, conf, priors, confidence_threshold=0.01, nms_threshold=0.45, top_k=400, keep_top_k=200):
+    """
+    Turn SSD box offsets and scores into detection rows, like the Caffe DetectionOutput layer
+
+    The defaults are the detection_output_param of the res10 deploy.prototxt
+    (CENTER_SIZE box coding, face as the only non-background class).
+
+    Args:
+        loc (numpy.ndarray): Box offsets of shape (batch, num_priors * 4)
+        conf (numpy.ndarray): Background/face scores of shape (batch, num_priors * 2)
+        priors (numpy.ndarray): Prior boxes and their variances, shape (2, num_priors * 4)
+        confidence_threshold (float): Scores at or below this are dropped before NMS
+        nms_threshold (float): IoU above which a lower-scoring box is suppressed
+        top_k (int): Highest-scoring candidates kept before NMS
+        keep_top_k (int): Detections kept per image after NMS
+
+    Returns:
+        numpy.ndarray: Rows [image, label, confidence, xmin, ymin, xmax, ymax]
+                       (normalized coordinates) of shape (1, 1, N, 7)
+    """
+    prior_boxes = priors[0].reshape(-1, 4)
+    variances = priors[1].reshape(-1, 4)
+    rows = []
+    for index in range(loc.shape[0]):
+        scores = conf[index].reshape(-1, 2)[:, 1]
+        candidates = np.flatnonzero(scores > confidence_threshold)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+        if len(candidates) == 0:
+            continue
+
+        # Decode only the candidates (center offsets scaled by the prior size, log-scale sizes)
+        prior = prior_boxes[candidates]
+        variance = variances[candidates]
+        offsets = loc[index].reshape(-1, 4)[candidates]
+        prior_size = prior[:, 2:] - prior[:, :2]
+        prior_center = (prior[:, :2] + prior[:, 2:]) / 2
+        center = variance[:, :2] * offsets[:, :2] * prior_size + prior_center
+        size = np.exp(variance[:, 2:] * offsets[:, 2:]) * prior_size
+        boxes = np.concatenate([center - size / 2, center + size / 2], axis=1)
+
+        # Greedy NMS in score order (candidates are already sorted)
+        keep = cv2.dnn.NMSBoxes(np.concatenate([boxes[:, :2], size], axis=1).tolist(),
+                                scores[candidates].tolist(), 0.0, nms_threshold)
+        keep = np.sort(np.asarray(keep, dtype=np.int64).ravel())[:keep_top_k]
+        image_rows = np.empty((len(keep), 7), dtype=np.float32)
+        image_rows[:, 0] = index
+        image_rows[:, 1] = 1
+        image_rows[:, 2] = scores[candidates[keep]]
+        image_rows[:, 3:] = boxes[keep]
+        rows.append(image_rows)
+
+    detections = np.concatenate(rows) if rows else np.zeros((0, 7), dtype=np.float32)
+    return detections.reshape(1, 1, -1, 7)
+
+
+def _update_latency(backend, start):
+    """Update a backend's running per-inference latency estimate"""
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if backend.latency_ms:
+        backend.latency_ms = 0.9 * backend.latency_ms + 0.1 * elapsed_ms
+    else:
+        backend.latency_ms = elapsed_ms
+
+
+def warmup(backend, runs=3, input_size=(300, 300)):
+    """
+    Run warmup inferences and measure per-inference latency
+
+    Args:
+        backend: Inference backend
+        runs (int): Number of timed runs after the first (untimed) inference
+        input_size (tuple): Network input size (width, height)
+
+    Returns:
+        float: Average per-inference latency in milliseconds
+    """
+    blob = np.zeros((1, 3, input_size[1], input_size[0]), dtype=np.float32)
+
+    # First inference allocates buffers and selects kernels
+    backend.infer(blob)
+
+    timings = []
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        backend.infer(blob)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    backend.latency_ms = sum(timings) / len(timings)
+    print(f"Face detection backend: {backend.description}, warmup latency {backend.latency_ms:.1f} ms")
+    return backend.latency_ms
+
+
+def create_face_backend(config, proto_path, model_path, models_dir):
+    """
+    Create the face detection backend selected in the configuration
+
+    If the selected backend cannot be created, the int8 ONNX backend falls back to
+    the float ONNX model, and any backend falls back to OpenCV DNN on the default
+    Caffe model.
+
+    Args:
+        config (dict): Backend configuration (detection.backend in config.yaml)
+        proto_path (str): Path to the Caffe prototxt
+        model_path (str): Path to the Caffe model
+        models_dir (str): Directory relative ONNX model paths are resolved against
+
+    Returns:
+        Inference backend with an infer(blob) method
+    """
+    config = config or {}
+    backend_type = config.get("type", "opencv")
+    num_threads = config.get("onnx_threads", 0)
+
+    def resolve(path):
+        return path if os.path.isabs(path) else os.path.join(models_dir, path)
+
+    def create(backend_type):
+        if backend_type == "onnxruntime":
+            return ONNXRuntimeBackend(resolve(config.get("onnx_model", "res10_300x300_ssd.onnx")),
+                                      num_threads=num_threads)
+        if backend_type == "onnxruntime_int8":
+            return ONNXRuntimeBackend(resolve(config.get("int8_model", "res10_300x300_ssd_int8.onnx")),
+                                      num_threads=num_threads, quantized=True)
+        if backend_type == "opencv":
+            return OpenCVDNNBackend(proto_path, model_path,
+                                    backend=config.get("opencv_backend", "default"),
+                                    target=config.get("opencv_target", "cpu"))
+        if backend_type == "opencv_default":
+            return OpenCVDNNBackend(proto_path, model_path)
+        raise ValueError(f"Unknown face detection backend: {backend_type}")
+
+    candidates = [backend_type]
+    if backend_type == "onnxruntime_int8":
+        candidates.append("onnxruntime")
+    candidates.append("opencv_default")
+
+    for index, candidate in enumerate(candidates):
+        try:
+            backend = create(candidate)
+            warmup(backend, runs=config.get("warmup_runs", 3))
+            return backend
+        except (ImportError, FileNotFoundError, ValueError, RuntimeError, cv2.error) as e:
+            if index == len(candidates) - 1:
+                raise
+            print(f"Warning: Could not create face detection backend '{candidate}': {e}")
+            fallback = candidates[index + 1]
+            print("Falling back to the " + ("default OpenCV DNN backend" if fallback == "opencv_default"
+                                            else f"'{fallback}' backend"))
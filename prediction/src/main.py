@@ -6,19 +6,24 @@ Driver Drowsiness Detection System - Main Application
 import argparse
 import cv2
 import time
-import yaml
 import os
 import sys
+import threading
 from datetime import datetime
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.face_detector import FaceDetector
-from src.eye_detector import EyeDetector
-from src.drowsiness_detector import DrowsinessDetector
 from src.audio_alerts import AudioAlerts
-from src.utils import FPS, draw_status, display_eye_tracking_data
+from src.utils import FPS, load_config
+from src.renderer import FrameRenderer
+from src.governor import ProcessingGovernor
+from src.pipeline import (FrameRingBuffer, CaptureThread, PipelineStats, analyze_faces,
+                          create_vision_components, create_driver_selector, select_driver)
+from src.replay import ReplaySource, run_replay
+from src.metrics import registry, MetricsPublisher, DEFAULT_SOCKET_PATH
+from src.frame_bus import FrameBusWriter, DEFAULT_FRAME_BUS_PATH
+from src.event_bus import EventPublisher, DEFAULT_EVENT_SOCKET_PATH
 
 def parse_args():
     """Parse command line arguments"""
@@ -29,16 +34,44 @@ def parse_args():
                         help="Camera device ID (overrides config file)")
     parser.add_argument("--gemini-api-key", type=str, default=None,
                         help="Gemini API key (overrides config file)")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="Replay a recorded video file or image directory instead of the camera")
+    parser.add_argument("--replay-output", type=str, default="replay_results.csv",
+                        help="Per-frame results file written in replay mode")
+    parser.add_argument("--replay-fps", type=float, default=None,
+                        help="Frame rate of an image directory (defaults to camera.fps)")
+    parser.add_argument("--standby", action="store_true",
+                        help="Load everything, then wait for arm/disarm/quit commands on stdin")
     return parser.parse_args()
 
-def load_config(config_path):
-    """Load configuration from YAML file"""
-    try:
-        with open(config_path, 'r') as file:
-            return yaml.safe_load(file)
-    except Exception as e:
-        print(f"Error loading config file: {e}")
-        sys.exit(1)
+def start_command_reader(armed, stop_requested):
+    """
+    Read standby commands from stdin on a background thread
+    
+    Args:
+        armed (threading.Event): Set while detection should run
+        stop_requested (threading.Event): Set when the process should exit
+    """
+    def read_commands():
+        for line in sys.stdin:
+            command = line.strip()
+            if command == "arm":
+                armed.set()
+            elif command == "disarm":
+                armed.clear()
+            elif command == "quit":
+                break
+            elif command:
+                print(f"Unknown standby command: {command}")
+        # quit or stdin closed (the supervising server went away)
+        stop_requested.set()
+        armed.set()
+    
+    threading.Thread(target=read_commands, daemon=True).start()
+
+def publish_worker_state(event_publisher, state):
+    """Tell the server about a standby state change (tagged with our pid so a replaced worker's events are ignored)"""
+    event_publisher.publish({"type": "worker", "state": state, "pid": os.getpid()})
 
 def main():
     """Main function to run the drowsiness detection system"""
@@ -55,25 +88,34 @@ def main():
     if not gemini_api_key:
         print("Warning: No Gemini API key provided. Voice analysis will be limited.")
     
+    # OpenCV's thread pool is process-wide; size it before any model is loaded
+    opencv_threads = config.get('pipeline', {}).get('opencv_threads', 0)
+    if opencv_threads:
+        cv2.setNumThreads(opencv_threads)
+    
     # Initialize components
-    face_detector = FaceDetector(
-        confidence_threshold=config['detection']['face_confidence']
-    )
+    face_detector, eye_detector, drowsiness_detector = create_vision_components(config)
+    driver_selector = create_driver_selector(config)
     
-    eye_detector = EyeDetector(
-        landmarks_model=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                     "models/shape_predictor_68_face_landmarks.dat")
-    )
+    # Preallocated landmark buffers, one per face slot, reused across frames
+    landmark_buffers = []
+    
+    # Offline replay: run the vision pipeline on a recording as fast as possible
+    if args.replay:
+        try:
+            source = ReplaySource(args.replay, fps=args.replay_fps or config['camera']['fps'])
+        except (FileNotFoundError, IOError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        run_replay(source, face_detector, eye_detector, drowsiness_detector, args.replay_output,
+                   driver_selector)
+        return
     
-    # Use more sensitive threshold values for drowsiness detection
-    drowsiness_detector = DrowsinessDetector(
-        eye_aspect_ratio_threshold=config['detection'].get('eye_aspect_ratio_threshold', 0.3),
-        consecutive_frames_threshold=config['detection'].get('consecutive_frames_threshold', 10),
-        normal_duration_threshold=config['drowsiness']['normal'].get('duration_threshold', 1.5),
-        extreme_duration_threshold=config['drowsiness']['extreme'].get('duration_threshold', 0.8),
-        normal_ear_threshold=config['drowsiness']['normal'].get('ear_threshold', 0.3),
-        extreme_ear_threshold=config['drowsiness']['extreme'].get('ear_threshold', 0.25)
+    # Status changes and assistant responses are pushed to the server
+    event_publisher = EventPublisher(
+        socket_path=config.get('events', {}).get('socket_path', DEFAULT_EVENT_SOCKET_PATH)
     )
+    event_publisher.start()
     
     audio_alerts = AudioAlerts(
         normal_message=config['drowsiness']['normal']['message'],
@@ -82,7 +124,11 @@ def main():
         gemini_api_key=gemini_api_key,
         gemini_api_url=config.get('gemini', {}).get('api_url', 
                                 "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"),
-        relevant_topics_file=config['file_path']['relevant_topics_file']
+        relevant_topics_file=config['file_path']['relevant_topics_file'],
+        event_publisher=event_publisher,
+        tts_cache_dir=config.get('tts_cache', {}).get('dir'),
+        tts_cache_max_disk_mb=config.get('tts_cache', {}).get('max_disk_mb', 50),
+        tts_cache_max_memory_mb=config.get('tts_cache', {}).get('max_memory_mb', 16)
     )
     
     # Initialize camera
@@ -95,26 +141,150 @@ def main():
         print(f"Error: Could not open camera {config['camera']['device_id']}")
         sys.exit(1)
     
+    # Start capture stage: the camera is read on its own thread into a latest-frame buffer
+    pipeline_config = config.get('pipeline', {})
+    frame_buffer = FrameRingBuffer(
+        (config['camera']['resolution'][1], config['camera']['resolution'][0], 3),
+        num_slots=pipeline_config.get('buffer_slots', 3)
+    )
+    capture_thread = CaptureThread(camera, frame_buffer)
+    capture_thread.start()
+    pipeline_stats = PipelineStats(frame_buffer, capture_thread,
+                                   report_interval=pipeline_config.get('stats_interval', 5.0))
+    
+    # Lower the analysis rate while the driver is clearly alert
+    governor_config = config.get('governor', {})
+    governor = ProcessingGovernor(
+        eye_aspect_ratio_threshold=drowsiness_detector.eye_aspect_ratio_threshold,
+        full_fps=config['camera']['fps'],
+        min_fps=governor_config.get('min_fps', 10),
+        enabled=governor_config.get('enabled', False),
+        alert_ear_margin=governor_config.get('alert_ear_margin', 0.05),
+        stable_seconds=governor_config.get('stable_seconds', 30.0),
+        max_ear_drop=governor_config.get('max_ear_drop', 0.03)
+    )
+    
+    # Processed frames are shared with the server's /video stream (single camera owner)
+    frame_bus_config = config.get('frame_bus', {})
+    frame_bus = None
+    if frame_bus_config.get('enabled', True):
+        try:
+            frame_bus = FrameBusWriter(
+                (config['camera']['resolution'][1], config['camera']['resolution'][0], 3),
+                path=frame_bus_config.get('path', DEFAULT_FRAME_BUS_PATH),
+                num_slots=frame_bus_config.get('slots', 4)
+            )
+        except OSError as e:
+            print(f"Warning: Could not create frame bus: {e}")
+    
+    # Annotations are only drawn while someone is looking at the frames
+    display_config = config.get('display', {})
+    show_window = display_config.get('show_window', False)
+    renderer = FrameRenderer(
+        face_detector, eye_detector,
+        eye_threshold=drowsiness_detector.eye_aspect_ratio_threshold,
+        mode=display_config.get('render', 'auto'),
+        has_viewer=lambda: show_window or (frame_bus is not None and frame_bus.has_viewer())
+    )
+    
     # Initialize FPS counter
     fps_counter = FPS()
     
+    # Publish runtime metrics to the server's /metrics endpoint
+    metrics_config = config.get('metrics', {})
+    metrics_publisher = None
+    if metrics_config.get('enabled', True):
+        def collect_metrics():
+            registry.set("frames_captured_total", frame_buffer.frames_written)
+            registry.set("frames_dropped_total", frame_buffer.frames_dropped)
+            registry.set("frames_processed_total", pipeline_stats.frames_processed)
+            registry.set("fps", fps_counter.fps)
+            registry.set("analysis_target_fps", governor.target_fps)
+            registry.set("face_backend_latency_seconds", face_detector.backend.latency_ms / 1000.0)
+            blink_features = drowsiness_detector.blink_features.features()
+            registry.set("blink_rate_per_minute", blink_features["blink_rate"])
+            registry.set("blink_duration_seconds", blink_features["blink_duration"])
+            registry.set("blinks_total", blink_features["total_blinks"])
+            registry.set("microsleeps_total", blink_features["total_microsleeps"])
+            registry.set("eye_aspect_ratio_threshold", drowsiness_detector.eye_aspect_ratio_threshold)
+            registry.set("tts_cache_hits_total", audio_alerts.tts_cache.hits)
+            registry.set("tts_cache_misses_total", audio_alerts.tts_cache.misses)
+        
+        metrics_publisher = MetricsPublisher(
+            registry,
+            socket_path=metrics_config.get('socket_path', DEFAULT_SOCKET_PATH),
+            interval=metrics_config.get('interval', 1.0),
+            collect=collect_metrics
+        )
+        metrics_publisher.start()
+    
+    # Warm standby: models and camera are loaded, detection runs only while armed
+    armed = threading.Event()
+    stop_requested = threading.Event()
+    if args.standby:
+        start_command_reader(armed, stop_requested)
+    else:
+        armed.set()
+    was_armed = False
+    
     print("Driver Drowsiness Detection System Started")
-    print("Press 'q' to quit")
+    if show_window:
+        print("Press 'q' to quit")
+    publish_worker_state(event_publisher, "ready")
 
     # Variables for face detection alerts
     face_detected = False
     face_detection_start_time = time.time()
     last_no_face_alert_time = time.time()
     no_face_alert_interval = config['face_detection']['alert_interval']  # seconds between no-face alerts
-    status_file_path = config['file_path']['status_file']
     
-    # Main loop
-    while True:
-        # Read frame from camera
-        ret, frame = camera.read()
-        if not ret:
-            print("Error: Failed to capture frame")
-            break
+    # Inference loop: always works on the newest captured frame
+    while not stop_requested.is_set():
+        if not armed.is_set():
+            if was_armed:
+                was_armed = False
+                audio_alerts.end_conversation()
+                audio_alerts.update("AWAKE")
+                publish_worker_state(event_publisher, "disarmed")
+            
+            # Keep the camera preview going only while a client is watching
+            viewer = frame_bus is not None and frame_bus.has_viewer()
+            capture_thread.paused = not viewer
+            latest = frame_buffer.acquire_latest(timeout=0.1) if viewer else None
+            if latest is not None:
+                frame_bus.publish(latest[1], latest[2])
+            elif not viewer:
+                armed.wait(0.1)
+            if not capture_thread.is_alive():
+                break
+            continue
+        
+        if not was_armed:
+            # A new drive starts without history from the previous one
+            was_armed = True
+            capture_thread.paused = False
+            # The buffered frame may predate arming (captured for the preview or before a pause)
+            frame_buffer.flush()
+            drowsiness_detector.reset()
+            face_detector.reset_tracking()
+            driver_selector.reset()
+            governor.reset()
+            face_detection_start_time = time.time()
+            last_no_face_alert_time = time.time()
+            publish_worker_state(event_publisher, "armed")
+        
+        # Wait if the governor has lowered the analysis rate
+        delay = governor.next_frame_delay(time.time())
+        if delay > 0:
+            time.sleep(delay)
+        
+        # Take the latest frame from the capture stage
+        latest = frame_buffer.acquire_latest(timeout=1.0)
+        if latest is None:
+            if not capture_thread.is_alive():
+                break
+            continue
+        _, frame, capture_time = latest
         
         # Start FPS calculation
         fps_counter.start()
@@ -123,36 +293,29 @@ def main():
         current_time = time.time()
         
         # Detect face in the frame
+        stage_start = time.perf_counter()
         faces = face_detector.detect(frame)
+        registry.observe("stage_latency_seconds", time.perf_counter() - stage_start, stage="face_detect")
+        
+        # Only the driver's face goes through the landmark stage
+        faces = select_driver(frame, faces, face_detector, driver_selector)
+        
+        # Landmarks, EAR and drowsiness for each analyzed face
+        face_results = analyze_faces(frame, faces, face_detector, eye_detector,
+                                     drowsiness_detector, landmark_buffers)
+        
+        # Follow threshold changes from the per-driver calibration
+        if governor.eye_aspect_ratio_threshold != drowsiness_detector.eye_aspect_ratio_threshold:
+            governor.eye_aspect_ratio_threshold = drowsiness_detector.eye_aspect_ratio_threshold
+            renderer.set_eye_threshold(drowsiness_detector.eye_aspect_ratio_threshold)
         
         # Current drowsiness level (defaults to AWAKE if no face detected)
-        current_drowsiness_level = "AWAKE"
+        current_drowsiness_level = face_results[-1]["level"] if face_results else "AWAKE"
         
-        # Process each detected face
+        # Track face presence for the no-face alert
         if faces:
             face_detected = True
             last_no_face_alert_time = time.time()
-            
-            for face in faces:
-                # Detect eyes landmarks
-                landmarks = eye_detector.detect(frame, face)
-                
-                # Calculate eye aspect ratio
-                left_ear, right_ear = eye_detector.calculate_eye_aspect_ratio(landmarks)
-                avg_ear = (left_ear + right_ear) / 2.0
-                
-                # Draw eye landmarks
-                eye_detector.draw_eyes(frame, landmarks)
-                
-                # Check for drowsiness
-                current_drowsiness_level = drowsiness_detector.detect(avg_ear)
-                
-                # Draw drowsiness status on frame
-                draw_status(frame, current_drowsiness_level, avg_ear)
-                
-                # Display eye tracking data
-                display_eye_tracking_data(frame, left_ear, right_ear, avg_ear, 
-                                        drowsiness_detector.eye_aspect_ratio_threshold)
         else:
             face_detected = False
             
@@ -165,37 +328,52 @@ def main():
                     audio_alerts.play_no_face_alert(config['face_detection']['message'])
                     last_no_face_alert_time = current_time
         
-        # with open(status_file_path, "w") as f:
-        #     f.write(current_drowsiness_level)
-
         # Update audio alerts based on current drowsiness level
+        stage_start = time.perf_counter()
         audio_alerts.update(current_drowsiness_level)
+        registry.observe("stage_latency_seconds", time.perf_counter() - stage_start, stage="audio_update")
+        
+        # Let the governor pick the analysis rate for the next frame
+        governor.update(current_time, face_results[-1]["avg_ear"] if face_results else None,
+                        current_drowsiness_level, drowsiness_detector.closure_percentage)
         
         # End FPS calculation
         fps = fps_counter.update()
         
-        # Display FPS on frame
-        cv2.putText(frame, f"FPS: {fps:.2f}", (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        
-        # Display face detection status
-        status_text = "Face detected" if face_detected else f"No face detected for {current_time - last_no_face_alert_time:.1f}s"
+        # Draw annotations only when there is a viewer
+        if renderer.is_active():
+            stage_start = time.perf_counter()
+            renderer.render(frame, face_results, fps, face_detected,
+                            current_time - last_no_face_alert_time)
+            registry.observe("stage_latency_seconds", time.perf_counter() - stage_start, stage="render")
         
-        cv2.putText(frame, status_text, (10, 60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, 
-                    (0, 255, 0) if face_detected else (0, 0, 255), 2)
+        # Share the processed frame with the server while a client is watching
+        if frame_bus is not None and frame_bus.has_viewer():
+            frame_bus.publish(frame, capture_time)
         
         # Display frame
-        # cv2.imshow("Driver Drowsiness Detection", frame)
+        if show_window:
+            cv2.imshow("Driver Drowsiness Detection", frame)
+            
+            # Check for quit command
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
         
-        # Check for quit command
-        # if cv2.waitKey(1) & 0xFF == ord('q'):
-        #     break
+        # Record glass-to-decision latency and queue statistics
+        pipeline_stats.record(capture_time, current_time, time.time())
     
     # Clean up
+    if metrics_publisher is not None:
+        metrics_publisher.stop()
+    capture_thread.stop()
+    if frame_bus is not None:
+        frame_bus.close()
+    frame_buffer.release()
     camera.release()
-    # cv2.destroyAllWindows()
+    if show_window:
+        cv2.destroyAllWindows()
     audio_alerts.cleanup()
+    event_publisher.stop()
     print("Driver Drowsiness Detection System Stopped")
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+"""
+Runtime performance metrics for the drowsiness detection process
+
+Latency histograms and counters are aggregated in process and published as one
+small snapshot per interval over a Unix datagram socket; the FastAPI server
+listens on that socket and exposes the data on /metrics.
+"""
+
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_SOCKET_PATH = "/tmp/nocturne_metrics.sock"
+
+# Latency bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Initialize the histogram
+
+        Args:
+            buckets (tuple): Sorted bucket upper bounds; an implicit +Inf bucket is added
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record one observation"""
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        """Serializable form of the histogram"""
+        return {"buckets": list(self.buckets), "counts": list(self.counts),
+                "sum": self.sum, "count": self.count}
+
+
+class MetricsRegistry:
+    """
+    Class to hold histograms, counters and gauges keyed by metric name and labels
+    """
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, value, **labels):
+        """
+        Record a latency observation
+
+        Args:
+            name (str): Metric name, e.g. "stage_latency_seconds"
+            value (float): Observed value in seconds
+            **labels: Metric labels, e.g. stage="face_detect"
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        """Increment a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Set a gauge (or a counter maintained elsewhere)"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Context manager recording the duration of its block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """
+        Get a serializable snapshot of all metrics
+
+        Returns:
+            dict: Histograms, counters and gauges as lists of {name, labels, ...} entries
+        """
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "histograms": [dict(name=name, labels=dict(labels), **histogram.to_dict())
+                               for (name, labels), histogram in self.histograms.items()],
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in self.counters.items()],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in self.gauges.items()],
+            }
+
+
+class MetricsPublisher(threading.Thread):
+    """
+    Thread that periodically sends registry snapshots to the server over a Unix datagram socket
+    """
+
+    def __init__(self, registry, socket_path=DEFAULT_SOCKET_PATH, interval=1.0, collect=None):
+        """
+        Initialize the publisher
+
+        Args:
+            registry (MetricsRegistry): Registry to publish
+            socket_path (str): Path of the server's Unix datagram socket
+            interval (float): Seconds between snapshots
+            collect (callable): Called before each snapshot to refresh gauges
+        """
+        super().__init__(daemon=True)
+        self.registry = registry
+        self.socket_path = socket_path
+        self.interval = interval
+        self.collect = collect
+        self.stopped = threading.Event()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def run(self):
+        """Publish snapshots until stopped"""
+        while not self.stopped.wait(self.interval):
+            self.publish()
+
+    def publish(self):
+        """Send one snapshot; silently skipped when the server is not listening"""
+        if self.collect is not None:
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        try:
+            payload = json.dumps(self.registry.snapshot()).encode("utf-8")
+            self.sock.sendto(payload, self.socket_path)
+        except OSError:
+            pass
+
+    def stop(self):
+        """Stop publishing"""
+        self.stopped.set()
+        self.sock.close()
+
+
+# Process-wide registry used by the detection pipeline and audio alerts
+registry = MetricsRegistry()
@@ -0,0 +1,439 @@
+"""
+Staged capture / inference pipeline for the drowsiness detection system
+"""
+
+import os
+import threading
+import time
+import numpy as np
+
+from src.face_detector import FaceDetector
+from src.eye_detector import EyeDetector
+from src.drowsiness_detector import DrowsinessDetector
+from src.calibration import EARBaselineCalibrator
+from src.driver_selector import DriverSelector
+from src.metrics import registry
+
+def create_vision_components(config):
+    """
+    Create the face, eye and drowsiness detectors from the configuration
+
+    Args:
+        config (dict): Loaded config.yaml
+
+    Returns:
+        tuple: (FaceDetector, EyeDetector, DrowsinessDetector)
+    """
+    tracking_config = config['detection'].get('tracking', {})
+    search_window_config = config['detection'].get('search_window', {})
+    face_detector = FaceDetector(
+        confidence_threshold=config['detection']['face_confidence'],
+        detection_interval=tracking_config.get('detection_interval', 1),
+        tracker=tracking_config.get('tracker', 'landmarks'),
+        max_box_change=tracking_config.get('max_box_change', 0.3),
+        search_window=search_window_config.get('enabled', False),
+        search_margin=search_window_config.get('margin', 0.75),
+        nms_threshold=config['detection'].get('nms_threshold', 0.0),
+        max_faces=config['detection'].get('max_faces', 0),
+        backend_config=config['detection'].get('backend')
+    )
+
+    eye_detector = EyeDetector(
+        landmarks_model=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     "models/shape_predictor_68_face_landmarks.dat"),
+        eye_only=config['detection'].get('eye_only_landmarks', False)
+    )
+
+    # Per-driver EAR baseline calibration
+    calibration_config = config.get('calibration', {})
+    calibrator = None
+    if calibration_config.get('enabled', False):
+        calibrator = EARBaselineCalibrator(
+            duration=calibration_config.get('duration', 120.0),
+            min_samples=calibration_config.get('min_samples', 300),
+            quantile=calibration_config.get('quantile', 0.8),
+            closed_ratio=calibration_config.get('closed_ratio', 0.8),
+            normal_ratio=calibration_config.get('normal_ratio', 0.7),
+            extreme_ratio=calibration_config.get('extreme_ratio', 0.6),
+            min_threshold=calibration_config.get('min_threshold', 0.12),
+            max_threshold=calibration_config.get('max_threshold', 0.4)
+        )
+    
+    # Use more sensitive threshold values for drowsiness detection
+    drowsiness_detector = DrowsinessDetector(
+        eye_aspect_ratio_threshold=config['detection'].get('eye_aspect_ratio_threshold', 0.3),
+        consecutive_frames_threshold=config['detection'].get('consecutive_frames_threshold', 10),
+        normal_duration_threshold=config['drowsiness']['normal'].get('duration_threshold', 1.5),
+        extreme_duration_threshold=config['drowsiness']['extreme'].get('duration_threshold', 0.8),
+        normal_ear_threshold=config['drowsiness']['normal'].get('ear_threshold', 0.3),
+        extreme_ear_threshold=config['drowsiness']['extreme'].get('ear_threshold', 0.25),
+        closure_window=config['drowsiness'].get('closure_window', 1.0),
+        max_sample_duration=config['drowsiness'].get('max_sample_duration', 0.25),
+        microsleep_duration=config['drowsiness'].get('microsleep_duration', 0.5),
+        microsleep_alert_count=config['drowsiness'].get('microsleep_alert_count', 0),
+        blink_window=config['drowsiness'].get('blink_window', 60.0),
+        calibrator=calibrator
+    )
+
+    return face_detector, eye_detector, drowsiness_detector
+
+
+def create_driver_selector(config):
+    """
+    Create the primary driver selector from the configuration
+
+    Args:
+        config (dict): Loaded config.yaml
+
+    Returns:
+        DriverSelector: Driver selector (disabled if driver_selection.enabled is false)
+    """
+    selection_config = config.get('driver_selection', {})
+    return DriverSelector(
+        enabled=selection_config.get('enabled', False),
+        driver_side=selection_config.get('driver_side', 'center'),
+        size_weight=selection_config.get('size_weight', 0.5),
+        position_weight=selection_config.get('position_weight', 0.2),
+        continuity_weight=selection_config.get('continuity_weight', 0.3),
+        switch_margin=selection_config.get('switch_margin', 0.15)
+    )
+
+
+def select_driver(frame, faces, face_detector, driver_selector):
+    """
+    Keep only the driver's face so the landmark stage runs once per frame
+
+    Args:
+        frame (numpy.ndarray): Input image
+        faces (list): Face bounding boxes returned by face_detector.detect()
+        face_detector (FaceDetector): Face detector (tracking is restricted to the driver)
+        driver_selector (DriverSelector): Driver selector
+
+    Returns:
+        list: The driver's face box, or all faces if selection is disabled
+    """
+    driver_index = driver_selector.select(faces, frame.shape)
+    if driver_index is None or len(faces) == 1:
+        return faces
+    return face_detector.keep_faces(faces, [driver_index])
+
+
+def analyze_faces(frame, faces, face_detector, eye_detector, drowsiness_detector,
+                  landmark_buffers, timestamp=None):
+    """
+    Run the landmark, EAR and drowsiness stages on the faces found in a frame
+
+    Args:
+        frame (numpy.ndarray): Input image
+        faces (list): Face bounding boxes returned by face_detector.detect()
+        face_detector (FaceDetector): Face detector (for confidences and tracking updates)
+        eye_detector (EyeDetector): Landmark detector
+        drowsiness_detector (DrowsinessDetector): Drowsiness state machine
+        landmark_buffers (list): Preallocated landmark arrays, one per face slot (grown as needed)
+        timestamp (float): Sample time passed to the drowsiness detector
+
+    Returns:
+        list: Per-face result dicts with "face", "confidence", "landmarks",
+              "left_ear", "right_ear", "avg_ear" and "level" keys
+    """
+    face_confidences = face_detector.last_confidences
+    face_results = []
+
+    for face_index, face in enumerate(faces):
+        # Detect eyes landmarks
+        if face_index >= len(landmark_buffers):
+            landmark_buffers.append(np.zeros((eye_detector.num_landmarks, 2), dtype=np.int32))
+        stage_start = time.perf_counter()
+        landmarks = eye_detector.detect(frame, face, out=landmark_buffers[face_index])
+
+        # Carry the face box forward to the next frame from its landmarks
+        face_detector.update_track(face_index, landmarks)
+        landmarks_done = time.perf_counter()
+
+        # Calculate eye aspect ratio
+        left_ear, right_ear = eye_detector.calculate_eye_aspect_ratio(landmarks)
+        avg_ear = (left_ear + right_ear) / 2.0
+        ear_done = time.perf_counter()
+
+        # Check for drowsiness
+        drowsiness_level = drowsiness_detector.detect(avg_ear, timestamp)
+
+        registry.observe("stage_latency_seconds", landmarks_done - stage_start, stage="landmarks")
+        registry.observe("stage_latency_seconds", ear_done - landmarks_done, stage="ear")
+        registry.observe("stage_latency_seconds", time.perf_counter() - ear_done, stage="drowsiness")
+
+        face_results.append({
+            "face": face,
+            "confidence": face_confidences[face_index] if face_index < len(face_confidences) else None,
+            "landmarks": landmarks,
+            "left_ear": left_ear,
+            "right_ear": right_ear,
+            "avg_ear": avg_ear,
+            "level": drowsiness_level
+        })
+
+    return face_results
+
+
+class FrameRingBuffer:
+    """
+    Preallocated latest-frame ring buffer shared by the capture and inference stages.
+
+    The writer always overwrites the oldest slot that is neither the newest frame
+    nor the frame currently held by the reader, so stale frames are dropped instead
+    of queueing up and the reader always gets the most recent capture.
+    """
+
+    def __init__(self, frame_shape, num_slots=3, dtype=np.uint8):
+        """
+        Initialize the ring buffer
+
+        Args:
+            frame_shape (tuple): Shape of a single frame (height, width, channels)
+            num_slots (int): Number of preallocated frame slots (minimum 3)
+            dtype (numpy.dtype): Data type of the frames
+        """
+        self.num_slots = max(3, int(num_slots))
+        self.slots = np.zeros((self.num_slots,) + tuple(frame_shape), dtype=dtype)
+        self.slot_seq = [0] * self.num_slots
+        self.slot_timestamps = [0.0] * self.num_slots
+
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Sequence bookkeeping
+        self.write_seq = 0
+        self.read_seq = 0
+        self.latest_slot = None
+        self.held_slot = None
+
+        # Statistics
+        self.frames_written = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+
+    def write(self, frame, timestamp=None):
+        """
+        Copy a frame into the next free slot
+
+        Args:
+            frame (numpy.ndarray): Captured frame
+            timestamp (float): Capture timestamp (defaults to time.time())
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._cond:
+            # Reallocate if the camera delivers a different frame size than configured
+            if frame.shape != self.slots.shape[1:] or frame.dtype != self.slots.dtype:
+                if self.held_slot is not None:
+                    # Cannot reallocate under the reader; drop this frame
+                    self.frames_dropped += 1
+                    return
+                self.slots = np.zeros((self.num_slots,) + frame.shape, dtype=frame.dtype)
+                self.latest_slot = None
+
+            slot = self._next_free_slot()
+            np.copyto(self.slots[slot], frame)
+
+            # The previous newest frame was never consumed, so it is now stale
+            if self.write_seq > self.read_seq:
+                self.frames_dropped += 1
+
+            self.write_seq += 1
+            self.slot_seq[slot] = self.write_seq
+            self.slot_timestamps[slot] = timestamp
+            self.latest_slot = slot
+            self.frames_written += 1
+            self._cond.notify_all()
+
+    def _next_free_slot(self):
+        """Pick the oldest slot that is neither the newest frame nor held by the reader"""
+        best_slot = None
+        for slot in range(self.num_slots):
+            if slot == self.latest_slot or slot == self.held_slot:
+                continue
+            if best_slot is None or self.slot_seq[slot] < self.slot_seq[best_slot]:
+                best_slot = slot
+        return best_slot
+
+    def acquire_latest(self, timeout=None):
+        """
+        Wait for and take ownership of the newest unread frame
+
+        The returned frame is a view into the buffer and remains valid until
+        release() or the next acquire_latest() call.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds (None waits forever)
+
+        Returns:
+            tuple: (sequence number, frame, capture timestamp) or None on timeout/close
+        """
+        with self._cond:
+            self.held_slot = None
+            if not self._cond.wait_for(lambda: self.write_seq > self.read_seq or self._closed,
+                                       timeout=timeout):
+                return None
+            if self.write_seq <= self.read_seq:
+                return None
+
+            slot = self.latest_slot
+            self.held_slot = slot
+            self.read_seq = self.slot_seq[slot]
+            self.frames_read += 1
+            return self.read_seq, self.slots[slot], self.slot_timestamps[slot]
+
+    def release(self):
+        """Release the frame returned by the last acquire_latest() call"""
+        with self._cond:
+            self.held_slot = None
+
+    def flush(self):
+        """Discard the unread frame, so the next acquire_latest() waits for a new capture"""
+        with self._cond:
+            if self.write_seq > self.read_seq:
+                self.frames_dropped += 1
+                self.read_seq = self.write_seq
+            self.held_slot = None
+
+    def close(self):
+        """Wake up any waiting reader and stop handing out frames"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def depth(self):
+        """Number of captured frames waiting to be processed (0 or 1)"""
+        with self._cond:
+            return 1 if self.write_seq > self.read_seq else 0
+
+
+class CaptureThread(threading.Thread):
+    """
+    Thread that owns the camera and continuously writes frames into a FrameRingBuffer
+    """
+
+    def __init__(self, camera, frame_buffer):
+        """
+        Initialize the capture thread
+
+        Args:
+            camera (cv2.VideoCapture): Opened camera
+            frame_buffer (FrameRingBuffer): Buffer to write frames into
+        """
+        super().__init__(daemon=True)
+        self.camera = camera
+        self.frame_buffer = frame_buffer
+        self.stopped = False
+        self.paused = False
+        self.failed = False
+        self.read_time_total = 0.0
+
+    def run(self):
+        """Capture frames until stopped or the camera fails"""
+        while not self.stopped:
+            if self.paused:
+                # Camera stays open (standby) but is not read
+                time.sleep(0.05)
+                continue
+            read_start = time.time()
+            ret, frame = self.camera.read()
+            if not ret:
+                print("Error: Failed to capture frame")
+                self.failed = True
+                break
+            read_time = time.time() - read_start
+            self.read_time_total += read_time
+            registry.observe("stage_latency_seconds", read_time, stage="capture")
+            self.frame_buffer.write(frame)
+        self.frame_buffer.close()
+
+    def stop(self):
+        """Stop capturing and wait for the thread to finish"""
+        self.stopped = True
+        if self.is_alive():
+            self.join(timeout=1.0)
+
+
+class PipelineStats:
+    """
+    Class to collect and periodically report per-stage pipeline statistics
+    """
+
+    def __init__(self, frame_buffer, capture_thread, report_interval=5.0):
+        """
+        Initialize pipeline statistics
+
+        Args:
+            frame_buffer (FrameRingBuffer): Buffer between the capture and inference stages
+            capture_thread (CaptureThread): Capture stage thread
+            report_interval (float): Seconds between printed reports (0 disables printing)
+        """
+        self.frame_buffer = frame_buffer
+        self.capture_thread = capture_thread
+        self.report_interval = report_interval
+        self.last_report_time = time.time()
+
+        self.frames_processed = 0
+        self.inference_time_total = 0.0
+        self.latency_total = 0.0
+        self.max_latency = 0.0
+
+    def record(self, capture_timestamp, inference_start, inference_end):
+        """
+        Record one processed frame
+
+        Args:
+            capture_timestamp (float): Time the frame was captured
+            inference_start (float): Time the inference stage started on the frame
+            inference_end (float): Time the inference stage finished the frame
+        """
+        latency = inference_end - capture_timestamp
+        registry.observe("frame_latency_seconds", latency)
+        self.frames_processed += 1
+        self.inference_time_total += inference_end - inference_start
+        self.latency_total += latency
+        self.max_latency = max(self.max_latency, latency)
+
+        if self.report_interval and inference_end - self.last_report_time >= self.report_interval:
+            self.report()
+            self.last_report_time = inference_end
+
+    def snapshot(self):
+        """
+        Get the current per-stage statistics
+
+        Returns:
+            dict: Statistics for the capture and inference stages
+        """
+        frames_written = self.frame_buffer.frames_written
+        processed = self.frames_processed
+        return {
+            "capture": {
+                "frames": frames_written,
+                "dropped": self.frame_buffer.frames_dropped,
+                "queue_depth": self.frame_buffer.depth,
+                "avg_read_ms": (self.capture_thread.read_time_total / frames_written * 1000
+                                if frames_written else 0.0),
+            },
+            "inference": {
+                "frames": processed,
+                "avg_process_ms": (self.inference_time_total / processed * 1000
+                                   if processed else 0.0),
+                "avg_latency_ms": self.latency_total / processed * 1000 if processed else 0.0,
+                "max_latency_ms": self.max_latency * 1000,
+            },
+        }
+
+    def report(self):
+        """Print the current per-stage statistics"""
+        stats = self.snapshot()
+        capture = stats["capture"]
+        inference = stats["inference"]
+        print(f"[pipeline] capture: frames={capture['frames']} dropped={capture['dropped']} "
+              f"depth={capture['queue_depth']} read={capture['avg_read_ms']:.1f}ms | "
+              f"inference: frames={inference['frames']} process={inference['avg_process_ms']:.1f}ms "
+              f"latency avg={inference['avg_latency_ms']:.1f}ms max={inference['max_latency_ms']:.1f}ms")
+        self.max_latency = 0.0
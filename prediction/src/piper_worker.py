@@ -0,0 +1,232 @@
+"""
+Long-lived Piper speech synthesis process
+
+The voice model is loaded once. Each sentence is sent to Piper as a JSON request
+whose output file is a named pipe: Piper writes the sentence's audio into the pipe
+and closes it, so the end of the data marks the end of the request exactly and the
+audio never touches the disk. Utterances are sent one sentence per request, so
+playback of the first sentence can start while the rest is still being synthesized.
+"""
+
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+from queue import Queue, Empty
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+class SynthesisError(RuntimeError):
+    """Raised when Piper fails or does not finish an utterance"""
+
+
+class PiperWorker:
+    """
+    Class that keeps a Piper process running and streams synthesized PCM from it
+    """
+
+    def __init__(self, piper_binary, model, sentence_timeout=15.0, default_sample_rate=22050):
+        """
+        Initialize the worker (the process is started by start())
+
+        Args:
+            piper_binary (str): Path of the Piper executable
+            model (str): Path of the ONNX voice model (its .json config gives the sample rate)
+            sentence_timeout (float): Seconds to wait for one sentence before giving up
+            default_sample_rate (int): Sample rate used if the model config cannot be read
+        """
+        self.piper_binary = piper_binary
+        self.model = model
+        self.sentence_timeout = sentence_timeout
+        self.sample_rate = default_sample_rate
+        try:
+            with open(model + ".json", "r") as file:
+                self.sample_rate = json.load(file)["audio"]["sample_rate"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not read voice config, assuming {default_sample_rate} Hz: {e}")
+
+        self.process = None
+        self.pipe_dir = None
+        self.pipe_path = None
+        self.results = Queue()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start the Piper process if it is not running (called with the lock held)"""
+        if self.process is not None and self.process.poll() is None:
+            return
+        # A fresh pipe per process, so a reader left from a killed process never sees new audio
+        self.pipe_dir = tempfile.mkdtemp(prefix="nocturne_piper_")
+        self.pipe_path = os.path.join(self.pipe_dir, "audio.wav")
+        os.mkfifo(self.pipe_path)
+        # Arguments are passed as a list: message text never goes through a shell
+        self.process = subprocess.Popen(
+            [self.piper_binary, "--model", self.model, "--json-input", "--output_file", self.pipe_path],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.results = Queue()
+        threading.Thread(target=self._read_pipe, args=(self.process, self.pipe_path, self.results),
+                         daemon=True).start()
+
+    @staticmethod
+    def _read_pipe(process, pipe_path, results):
+        """Queue the audio of each request: everything Piper writes between opening and closing the pipe"""
+        while process.poll() is None:
+            try:
+                with open(pipe_path, "rb") as pipe:
+                    data = pipe.read()
+            except OSError:
+                break
+            if data:
+                results.put(data)
+        results.put(None)
+
+    @staticmethod
+    def split_sentences(text):
+        """
+        Split text into the sentences sent to Piper one by one
+
+        Args:
+            text (str): Text to speak
+
+        Returns:
+            list: Non-empty single-line sentences
+        """
+        return [sentence for sentence in SENTENCE_END.split(" ".join(text.split())) if sentence]
+
+    def _synthesize_sentence(self, sentence):
+        """Synthesize one sentence and return its PCM (called with the lock held)"""
+        request = json.dumps({"text": sentence, "output_file": self.pipe_path})
+        try:
+            self.process.stdin.write((request + "\n").encode("utf-8"))
+            self.process.stdin.flush()
+        except OSError as e:
+            self._stop()
+            raise SynthesisError(f"Error sending text to Piper: {e}")
+
+        try:
+            data = self.results.get(timeout=self.sentence_timeout)
+        except Empty:
+            data = None
+        if data is None:
+            # Restart so late audio cannot be mistaken for the next request's
+            self._stop()
+            raise SynthesisError("Piper did not finish the sentence")
+
+        try:
+            with wave.open(io.BytesIO(data), "rb") as wav_file:
+                if wav_file.getsampwidth() != 2 or wav_file.getnchannels() != 1:
+                    raise SynthesisError("Unexpected Piper output format")
+                frames = wav_file.getnframes()
+                pcm = wav_file.readframes(frames)
+        except (EOFError, wave.Error) as e:
+            raise SynthesisError(f"Invalid Piper output: {e}")
+        if len(pcm) != frames * 2:
+            raise SynthesisError("Incomplete Piper output")
+        return pcm
+
+    def _synthesize_into(self, sentences, output):
+        """Synthesize all sentences into the output queue, holding the process only while Piper works"""
+        try:
+            with self._lock:
+                self.start()
+                for sentence in sentences:
+                    if self._stopping.is_set():
+                        raise SynthesisError("Piper worker stopped")
+                    output.put(self._synthesize_sentence(sentence))
+            output.put(None)
+        except (OSError, SynthesisError) as e:
+            output.put(SynthesisError(str(e)))
+
+    def synthesize_stream(self, text):
+        """
+        Synthesize an utterance, yielding PCM sentence by sentence as it is produced
+
+        Synthesis runs ahead on its own thread, so a slow consumer (e.g. playback)
+        does not hold up other utterances.
+
+        Args:
+            text (str): Text to speak
+
+        Yields:
+            bytes: 16-bit little-endian mono PCM at sample_rate
+
+        Raises:
+            SynthesisError: If Piper fails before the whole utterance is synthesized
+        """
+        output = Queue()
+        threading.Thread(target=self._synthesize_into, args=(self.split_sentences(text), output),
+                         daemon=True).start()
+        while True:
+            item = output.get()
+            if item is None:
+                return
+            if isinstance(item, SynthesisError):
+                raise item
+            yield item
+
+    def synthesize(self, text):
+        """
+        Synthesize a whole utterance
+
+        Args:
+            text (str): Text to speak
+
+        Returns:
+            bytes: 16-bit mono PCM
+
+        Raises:
+            SynthesisError: If Piper fails before the whole utterance is synthesized
+        """
+        return b"".join(self.synthesize_stream(text))
+
+    def write_wav(self, path, pcm):
+        """
+        Write PCM from this worker to a WAV file
+
+        Args:
+            path (str): Output file
+            pcm (bytes): 16-bit mono PCM at sample_rate
+        """
+        with wave.open(path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(pcm)
+
+    def stop(self):
+        """Stop the Piper process once the sentence being synthesized is finished"""
+        self._stopping.set()
+        try:
+            with self._lock:
+                self._stop()
+        finally:
+            self._stopping.clear()
+
+    def _stop(self):
+        """Stop the Piper process and remove its pipe (called with the lock held)"""
+        process = self.process
+        self.process = None
+        if process is not None and process.poll() is None:
+            try:
+                process.stdin.close()
+                process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+                process.wait()
+        if self.pipe_path is not None:
+            # Release a reader still waiting for Piper to open the pipe
+            try:
+                os.close(os.open(self.pipe_path, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+        if self.pipe_dir is not None:
+            shutil.rmtree(self.pipe_dir, ignore_errors=True)
+        self.pipe_dir = None
+        self.pipe_path = None
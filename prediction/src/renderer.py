@@ -0,0 +1,171 @@
+"""
+On-demand rendering of detection results onto frames
+"""
+
+import cv2
+import numpy as np
+
+class FrameRenderer:
+    """
+    Class to draw stored detection results onto a frame only when someone is watching.
+
+    Static parts of the annotations (the black status bar and metric panels with their
+    labels and threshold text) are pre-rendered once into an overlay whose regions are
+    copied onto each frame; only the values that change are drawn per frame.
+    """
+
+    def __init__(self, face_detector, eye_detector, eye_threshold, mode="auto", has_viewer=None):
+        """
+        Initialize the frame renderer
+
+        Args:
+            face_detector (FaceDetector): Detector used to draw face boxes
+            eye_detector (EyeDetector): Detector used to draw eye contours
+            eye_threshold (float): EAR threshold shown in the metrics panel
+            mode (str): "always" renders every frame, "never" disables rendering,
+                        "auto" renders only while has_viewer() returns True
+            has_viewer (callable): Returns True when a viewer is consuming frames
+        """
+        self.face_detector = face_detector
+        self.eye_detector = eye_detector
+        self.eye_threshold = eye_threshold
+        self.mode = mode
+        self.has_viewer = has_viewer
+
+        # Static overlay, built lazily for the frame size in use
+        self.overlay = None
+        self.overlay_regions = []
+
+    def set_eye_threshold(self, eye_threshold):
+        """
+        Update the EAR threshold shown in the metrics panel
+
+        Args:
+            eye_threshold (float): New EAR threshold
+        """
+        if eye_threshold != self.eye_threshold:
+            self.eye_threshold = eye_threshold
+            self.overlay = None
+
+    def is_active(self):
+        """
+        Check whether frames need to be rendered
+
+        Returns:
+            bool: True if annotations should be drawn
+        """
+        if self.mode == "always":
+            return True
+        if self.mode == "never":
+            return False
+        return self.has_viewer is not None and bool(self.has_viewer())
+
+    def _build_overlay(self, w, h):
+        """Pre-render the static parts of the annotations for a w x h frame"""
+        overlay = np.zeros((h, w, 3), dtype=np.uint8)
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        white = (255, 255, 255)
+
+        # Status bar background
+        status_bar_y = h - 60
+        status_region = (0, status_bar_y, w, h)
+
+        # Metric panel backgrounds (the overlay is black, so the panels need no drawing)
+        y_pos = 100
+        left_x = 10
+        right_x = w - 170
+        left_region = (left_x - 5, y_pos - 25, left_x + 155, y_pos + 65)
+        right_region = (right_x - 5, y_pos - 25, right_x + 155, y_pos + 65)
+
+        # Metric labels
+        cv2.putText(overlay, "Left Eye EAR:", (left_x, y_pos), font, 0.5, white, 1)
+        cv2.putText(overlay, "Right Eye EAR:", (left_x, y_pos + 20), font, 0.5, white, 1)
+        cv2.putText(overlay, "Avg. EAR:", (left_x, y_pos + 40), font, 0.5, white, 1)
+        cv2.putText(overlay, "Threshold:", (right_x, y_pos), font, 0.5, white, 1)
+        cv2.putText(overlay, f"{self.eye_threshold:.2f}", (right_x + 90, y_pos), font, 0.5, white, 1)
+
+        # Clip regions to the frame; the overlay is applied region by region
+        self.overlay_regions = []
+        for x0, y0, x1, y1 in (status_region, left_region, right_region):
+            x0, y0 = max(0, x0), max(0, y0)
+            x1, y1 = min(w, x1 + 1), min(h, y1 + 1)
+            if x1 > x0 and y1 > y0:
+                self.overlay_regions.append((x0, y0, x1, y1))
+        self.overlay = overlay
+
+    def _blend_overlay(self, frame):
+        """Copy the static overlay's regions (backgrounds and labels) onto the frame"""
+        (h, w) = frame.shape[:2]
+        if self.overlay is None or self.overlay.shape[:2] != (h, w):
+            self._build_overlay(w, h)
+        for x0, y0, x1, y1 in self.overlay_regions:
+            frame[y0:y1, x0:x1] = self.overlay[y0:y1, x0:x1]
+
+    def render(self, frame, results, fps, face_detected, no_face_duration):
+        """
+        Draw detection results onto the frame
+
+        Args:
+            frame (numpy.ndarray): Frame to annotate
+            results (list): Per-face result dicts with "face", "confidence", "landmarks",
+                            "left_ear", "right_ear", "avg_ear" and "level" keys
+            fps (float): Current processing rate
+            face_detected (bool): Whether a face is visible
+            no_face_duration (float): Seconds since a face was last seen
+
+        Returns:
+            None (modifies frame in-place)
+        """
+        font = cv2.FONT_HERSHEY_SIMPLEX
+
+        if results:
+            self.face_detector.draw_faces(frame, [result["face"] for result in results],
+                                          [result["confidence"] for result in results])
+            for result in results:
+                self.eye_detector.draw_eyes(frame, result["landmarks"])
+
+            # Static labels, then the values for the last processed face
+            self._blend_overlay(frame)
+            result = results[-1]
+            self._draw_status_values(frame, result["level"], result["avg_ear"])
+            self._draw_eye_values(frame, result["left_ear"], result["right_ear"], result["avg_ear"])
+
+        # FPS and face detection status
+        cv2.putText(frame, f"FPS: {fps:.2f}", (10, 30), font, 0.7, (0, 255, 0), 2)
+        status_text = "Face detected" if face_detected else f"No face detected for {no_face_duration:.1f}s"
+        cv2.putText(frame, status_text, (10, 60), font, 0.7,
+                    (0, 255, 0) if face_detected else (0, 0, 255), 2)
+
+    def _draw_status_values(self, frame, drowsiness_level, ear_value):
+        """Draw the status indicator, status text and EAR value onto the status bar"""
+        (h, w) = frame.shape[:2]
+        status_bar_y = h - 60
+
+        if drowsiness_level == "AWAKE":
+            color = (0, 255, 0)  # Green
+            status_text = "AWAKE"
+        elif drowsiness_level == "NORMAL":
+            color = (0, 165, 255)  # Orange
+            status_text = "DROWSY - Warning"
+        else:  # EXTREME
+            color = (0, 0, 255)  # Red
+            status_text = "EXTREMELY DROWSY - DANGER"
+
+        cv2.rectangle(frame, (10, status_bar_y + 10), (70, h - 10), color, -1)
+        cv2.putText(frame, status_text, (80, status_bar_y + 35),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+        ear_text = f"EAR: {ear_value:.2f}"
+        ear_text_size = cv2.getTextSize(ear_text, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+        cv2.putText(frame, ear_text, (w - ear_text_size[0] - 10, status_bar_y + 35),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+    def _draw_eye_values(self, frame, left_ear, right_ear, avg_ear):
+        """Draw the per-eye EAR values into the metrics panel"""
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        white = (255, 255, 255)
+        ear_color = (0, 0, 255) if avg_ear < self.eye_threshold else (0, 255, 0)
+
+        cv2.putText(frame, f"{left_ear:.2f}", (125, 100), font, 0.5, white, 1)
+        cv2.putText(frame, f"{right_ear:.2f}", (125, 120), font, 0.5, white, 1)
+        cv2.putText(frame, f"{avg_ear:.2f}", (125, 140), font, 0.5, ear_color, 1)
@@ -0,0 +1,231 @@
+"""
+Content-addressed cache for synthesized speech
+
+Fixed prompts (alert messages, the no-face alert, fixed assistant replies) are
+stored on disk as WAV files named by a hash of the message, the voice model and
+the synthesis parameters, so they are never synthesized again, including across
+restarts. Decoded sounds are also kept in memory; one-off utterances such as
+assistant replies are kept in memory only. Both levels evict least recently used
+entries to stay within a size budget.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+class TTSCache:
+    """
+    Two-level (disk + decoded in-memory) LRU cache of synthesized utterances
+    """
+
+    def __init__(self, cache_dir, voice_model, load, synthesis_params=None,
+                 max_disk_bytes=50 * 1024 * 1024, max_memory_bytes=16 * 1024 * 1024):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir (str): Directory holding the cached WAV files
+            voice_model (str): Path of the voice model (its identity is part of every key)
+            load (callable): Decodes a WAV file, returning (sound, size in bytes)
+            synthesis_params (dict): Synthesis parameters that change the output audio
+            max_disk_bytes (int): Size budget of the cache directory
+            max_memory_bytes (int): Size budget of the decoded sounds kept in memory
+        """
+        self.cache_dir = cache_dir
+        self.load = load
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # A replaced model file (different size or mtime) invalidates all entries
+        try:
+            stat = os.stat(voice_model)
+            voice_id = [os.path.basename(voice_model), stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            voice_id = [os.path.basename(voice_model)]
+        self.key_prefix = json.dumps({"voice": voice_id, "params": synthesis_params or {}},
+                                     sort_keys=True)
+
+        self._lock = threading.Lock()
+        self.memory = OrderedDict()  # key -> (sound, size)
+        self.memory_bytes = 0
+        self.disk = OrderedDict()  # key -> size, least recently used first
+        self.disk_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Index the WAV files already on disk, oldest access first"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp"):
+                # Left behind by a write that crashed
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(".wav"):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+        self._evict_disk()
+
+    def key(self, message):
+        """
+        Get the cache key of a message
+
+        Args:
+            message (str): Text to synthesize
+
+        Returns:
+            str: Hex digest identifying message, voice and parameters
+        """
+        return hashlib.sha256((self.key_prefix + "\0" + message).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        """Path of the cached WAV file for a key"""
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    def lookup(self, message):
+        """
+        Get the decoded sound for a message if it is cached
+
+        Args:
+            message (str): Text to synthesize
+
+        Returns:
+            object: Decoded sound, or None on a cache miss
+        """
+        key = self.key(message)
+        path = self.path(key)
+
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self._touch_disk(key, path)
+                self.hits += 1
+                return entry[0]
+            if key not in self.disk or not os.path.isfile(path):
+                return None
+
+        sound = self._load(key, path)
+        if sound is not None:
+            with self._lock:
+                self.hits += 1
+        return sound
+
+    def get(self, message, synthesize):
+        """
+        Get the decoded sound for a message, synthesizing it to disk only on a cache miss
+
+        Args:
+            message (str): Text to synthesize
+            synthesize (callable): Writes the message as a WAV file to the given path,
+                                   returning True on success
+
+        Returns:
+            object: Decoded sound, or None if synthesis or decoding failed
+        """
+        sound = self.lookup(message)
+        if sound is not None:
+            return sound
+
+        # Synthesize outside the lock into a private file, then publish it atomically
+        with self._lock:
+            self.misses += 1
+        key = self.key(message)
+        path = self.path(key)
+        temp_path = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            if not synthesize(message, temp_path) or not os.path.isfile(temp_path):
+                return None
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        return self._load(key, path)
+
+    def put_memory(self, message, sound, size):
+        """
+        Keep an already decoded sound in memory only, e.g. a one-off assistant reply
+
+        Args:
+            message (str): Text the sound was synthesized from
+            sound (object): Decoded sound
+            size (int): Decoded size in bytes
+        """
+        with self._lock:
+            self.misses += 1
+            self._add_memory(self.key(message), sound, size)
+
+    def _load(self, key, path):
+        """Decode a cached file and add it to both levels"""
+        try:
+            sound, size = self.load(path)
+        except Exception as e:
+            print(f"Error loading cached audio {path}: {e}")
+            return None
+
+        with self._lock:
+            self._add_disk(key, path)
+            self._add_memory(key, sound, size)
+        return sound
+
+    def _touch_disk(self, key, path):
+        """Mark a disk entry as recently used (the mtime orders entries across restarts)"""
+        if key in self.disk:
+            self.disk.move_to_end(key)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _add_disk(self, key, path):
+        """Record a file written or loaded from the cache directory"""
+        if key in self.disk:
+            self._touch_disk(key, path)
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self.disk[key] = size
+        self.disk_bytes += size
+        self._evict_disk(keep=key)
+
+    def _evict_disk(self, keep=None):
+        """Delete least recently used files until the directory fits its budget"""
+        while self.disk_bytes > self.max_disk_bytes and len(self.disk) > 1:
+            key, size = next(iter(self.disk.items()))
+            if key == keep:
+                break
+            del self.disk[key]
+            self.disk_bytes -= size
+            try:
+                os.unlink(self.path(key))
+            except OSError:
+                pass
+
+    def _add_memory(self, key, sound, size):
+        """Keep a decoded sound and evict least recently used ones over the budget"""
+        if key in self.memory:
+            self.memory_bytes -= self.memory.pop(key)[1]
+        self.memory[key] = (sound, size)
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            _, (_, old_size) = self.memory.popitem(last=False)
+            self.memory_bytes -= old_size
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from src.calibration import EARBaselineCalibrator, P2Quantile
+
+
+@pytest.mark.parametrize("quantile", [0.1, 0.5, 0.8, 0.95])
+@pytest.mark.parametrize("distribution", ["normal", "uniform", "bimodal"])
+def test_p2_quantile_matches_numpy(quantile, distribution):
+    rng = np.random.default_rng(0)
+    if distribution == "normal":
+        values = rng.normal(0.3, 0.03, 5000)
+    elif distribution == "uniform":
+        values = rng.uniform(0.1, 0.4, 5000)
+    else:
+        # Mostly open eyes with blinks in the low tail
+        values = np.where(rng.random(5000) < 0.9, rng.normal(0.32, 0.02, 5000), rng.normal(0.12, 0.03, 5000))
+
+    estimator = P2Quantile(quantile)
+    for value in values:
+        estimator.add(value)
+
+    # Compare by rank: in a sparse region (between the modes) a tiny rank error is a large value error
+    estimate = estimator.value()
+    assert np.mean(values <= estimate) == pytest.approx(quantile, abs=0.02)
+    if distribution != "bimodal":
+        assert estimate == pytest.approx(np.quantile(values, quantile), abs=0.005)
+
+
+def test_p2_quantile_few_samples():
+    estimator = P2Quantile(0.5)
+    assert estimator.value() is None
+    for value in (3.0, 1.0, 2.0):
+        estimator.add(value)
+    assert estimator.value() == 2.0
+
+
+def calibrate(calibrator, ears, interval=0.1):
+    for i, ear in enumerate(ears):
+        if calibrator.update(ear, i * interval):
+            return True
+    return False
+
+
+def test_thresholds_follow_baseline():
+    calibrator = EARBaselineCalibrator(duration=10.0, min_samples=50)
+    assert calibrate(calibrator, np.full(200, 0.3))
+    thresholds = calibrator.thresholds()
+    assert calibrator.baseline == pytest.approx(0.3)
+    assert thresholds["eye_aspect_ratio_threshold"] == pytest.approx(0.3 * 0.8)
+    assert thresholds["normal_ear_threshold"] == pytest.approx(0.3 * 0.7)
+    assert thresholds["extreme_ear_threshold"] == pytest.approx(0.3 * 0.6)
+    # NORMAL requires a deeper closure than the eyes-closed cut
+    assert (thresholds["eye_aspect_ratio_threshold"] > thresholds["normal_ear_threshold"]
+            > thresholds["extreme_ear_threshold"])
+
+
+@pytest.mark.parametrize("baseline, expected", [(0.05, 0.12), (0.9, 0.4)])
+def test_thresholds_are_clamped(baseline, expected):
+    calibrator = EARBaselineCalibrator(duration=10.0, min_samples=50, min_threshold=0.12, max_threshold=0.4)
+    assert calibrate(calibrator, np.full(200, baseline))
+    assert all(value == pytest.approx(expected) for value in calibrator.thresholds().values())
+
+
+def test_blinks_do_not_lower_baseline():
+    rng = np.random.default_rng(1)
+    # 30% of samples closed, e.g. a drowsy start
+    ears = np.where(rng.random(2000) < 0.7, 0.3, 0.1)
+    calibrator = EARBaselineCalibrator(duration=10.0, min_samples=50)
+    assert calibrate(calibrator, ears)
+    assert calibrator.baseline == pytest.approx(0.3, abs=0.01)
+
+
+def test_waits_for_duration_and_samples():
+    calibrator = EARBaselineCalibrator(duration=10.0, min_samples=500)
+    assert not calibrate(calibrator, np.full(200, 0.3))
+    assert not calibrator.calibrated
+
+
+def test_reset_restarts_calibration():
+    calibrator = EARBaselineCalibrator(duration=1.0, min_samples=10)
+    assert calibrate(calibrator, np.full(50, 0.3))
+    calibrator.reset()
+    assert not calibrator.calibrated and calibrator.baseline is None
+    assert calibrate(calibrator, np.full(50, 0.25))
+    assert calibrator.baseline == pytest.approx(0.25)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from src.drowsiness_detector import DrowsinessDetector
+
+
+def random_trace(rng, length):
+    """EAR trace alternating open, blink and long-closure segments with jittered frame times"""
+    ears = []
+    while len(ears) < length:
+        kind = rng.choice(["open", "blink", "drowsy"], p=[0.6, 0.25, 0.15])
+        if kind == "open":
+            ears.extend(rng.uniform(0.28, 0.4, rng.integers(5, 60)))
+        elif kind == "blink":
+            ears.extend(rng.uniform(0.1, 0.2, rng.integers(2, 6)))
+        else:
+            ears.extend(rng.uniform(0.15, 0.29, rng.integers(20, 80)))
+    ears = np.array(ears[:length])
+    # 10-30 fps with occasional dropped-frame gaps
+    intervals = rng.uniform(1 / 30, 1 / 10, length)
+    intervals[rng.random(length) < 0.02] += rng.uniform(0.2, 1.0)
+    timestamps = 1000.0 + np.cumsum(intervals)
+    return ears, timestamps
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_detect_many_matches_detect(seed):
+    rng = np.random.default_rng(seed)
+    ears, timestamps = random_trace(rng, 600)
+    kwargs = dict(microsleep_alert_count=int(seed % 3))
+
+    single = DrowsinessDetector(**kwargs)
+    expected = [single.detect(ear, ts) for ear, ts in zip(ears, timestamps)]
+
+    batch = DrowsinessDetector(**kwargs)
+    # Split into uneven batches so state carries over between calls
+    levels = []
+    for part in np.array_split(np.arange(len(ears)), rng.integers(1, 6)):
+        levels.extend(batch.detect_many(ears[part], timestamps[part]))
+
+    assert list(levels) == expected
+    assert batch.closure_percentage == pytest.approx(single.closure_percentage)
+
+
+def test_detect_many_empty():
+    assert len(DrowsinessDetector().detect_many([], [])) == 0
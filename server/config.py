@@ -0,0 +1,24 @@
+"""
+Settings shared with the detection process: the server reads the same config.yaml
+the detection worker is started with, so socket and frame bus paths are defined in
+one place.
+"""
+
+import os
+
+import yaml
+
+CONFIG_PATH = os.environ.get("NOCTURNE_CONFIG", os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "prediction", "config", "config.yaml")))
+
+
+def load_config(path=CONFIG_PATH):
+    try:
+        with open(path, "r") as file:
+            return yaml.safe_load(file) or {}
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Error loading config file {path}: {e}")
+        return {}
+
+
+config = load_config()
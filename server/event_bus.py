@@ -0,0 +1,97 @@
+"""
+Receives change-only events from the detection process over a Unix stream socket
+and broadcasts them to SSE subscribers.
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+
+from config import config
+
+EVENT_SOCKET_PATH = config.get("events", {}).get("socket_path", "/tmp/nocturne_events.sock")
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+class EventBroadcaster:
+    # Items are numbered so SSE clients can resume with Last-Event-ID from the
+    # last history_size items; other subscribers start from the latest item
+    def __init__(self, history_size=1):
+        self.subscribers = set()
+        self.history = deque(maxlen=history_size)
+        self.seq = 0
+
+    @property
+    def latest(self):
+        return self.history[-1][1] if self.history else None
+
+    def subscribe(self, last_event_id=None):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        for entry in self._backlog(last_event_id)[-SUBSCRIBER_QUEUE_SIZE:]:
+            queue.put_nowait(entry)
+        self.subscribers.add(queue)
+        return queue
+
+    def _backlog(self, last_event_id):
+        if not self.history:
+            return []
+        if last_event_id is not None and self.history[0][0] - 1 <= last_event_id <= self.seq:
+            return [entry for entry in self.history if entry[0] > last_event_id]
+        return [self.history[-1]]
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, item):
+        self.seq += 1
+        entry = (self.seq, item)
+        self.history.append(entry)
+        for queue in self.subscribers:
+            if queue.full():
+                # Drop the oldest item for a subscriber that is not keeping up
+                queue.get_nowait()
+            queue.put_nowait(entry)
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in str(data).split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+class EventServer:
+    def __init__(self, handlers, socket_path=EVENT_SOCKET_PATH):
+        self.handlers = handlers
+        self.socket_path = socket_path
+        self.server = None
+
+    async def start(self):
+        if self.server is not None:
+            return
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    event = json.loads(line.decode("utf-8"))
+                except ValueError as e:
+                    print(f"Error decoding event: {e}")
+                    continue
+                handler = self.handlers.get(event.get("type"))
+                if handler is not None:
+                    handler(event)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
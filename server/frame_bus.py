@@ -0,0 +1,114 @@
+"""
+Reads processed frames published by the detection process through the shared-memory
+frame bus (layout defined in prediction/src/frame_bus.py).
+"""
+
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from config import config
+
+FRAME_BUS_PATH = config.get("frame_bus", {}).get(
+    "path", "/dev/shm/nocturne_frames" if os.path.isdir("/dev/shm") else "/tmp/nocturne_frames")
+MAGIC = b"NFB1"
+HEADER_FORMAT = "<4sIIIIQd"
+HEADER_SIZE = 64
+LATEST_SEQ_OFFSET = 20
+HEARTBEAT_OFFSET = 28
+SLOT_HEADER_SIZE = 16
+POLL_INTERVAL = 0.005
+REOPEN_INTERVAL = 1.0
+
+
+class FrameBusReader:
+    def __init__(self, path=FRAME_BUS_PATH):
+        self.path = path
+        self.mm = None
+        self.inode = None
+        self.last_open_check = 0.0
+
+    def _open(self):
+        self.close()
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except OSError:
+            return False
+        try:
+            inode = os.fstat(fd).st_ino
+            mm = mmap.mmap(fd, 0)
+        except (OSError, ValueError):
+            return False
+        finally:
+            os.close(fd)
+        magic, num_slots, height, width, channels, _, _ = struct.unpack_from(HEADER_FORMAT, mm, 0)
+        if magic != MAGIC:
+            mm.close()
+            return False
+        self.mm = mm
+        self.inode = inode
+        self.num_slots = num_slots
+        self.shape = (height, width, channels) if channels > 1 else (height, width)
+        self.frame_bytes = height * width * channels
+        self.stride = (SLOT_HEADER_SIZE + self.frame_bytes + 63) // 64 * 64
+        return True
+
+    def _check_open(self):
+        # The writer replaces the file when it restarts or the frame size changes
+        now = time.monotonic()
+        if self.mm is not None and now - self.last_open_check < REOPEN_INTERVAL:
+            return True
+        self.last_open_check = now
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            self.close()
+            return False
+        if self.mm is None or inode != self.inode:
+            return self._open()
+        return True
+
+    def touch(self):
+        if self._check_open():
+            struct.pack_into("<d", self.mm, HEARTBEAT_OFFSET, time.time())
+
+    def latest_seq(self):
+        if self.mm is None:
+            return 0
+        return struct.unpack_from("<Q", self.mm, LATEST_SEQ_OFFSET)[0]
+
+    def wait_next(self, after_seq, timeout=1.0):
+        # Returns (seq, frame view, capture timestamp); the view is only valid while
+        # is_current(seq) holds
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._check_open():
+                seq = self.latest_seq()
+                if seq != after_seq and seq > 0:
+                    offset = HEADER_SIZE + (seq % self.num_slots) * self.stride
+                    slot_seq, timestamp = struct.unpack_from("<Qd", self.mm, offset)
+                    if slot_seq == seq:
+                        frame = np.ndarray(self.shape, dtype=np.uint8, buffer=self.mm,
+                                           offset=offset + SLOT_HEADER_SIZE)
+                        return seq, frame, timestamp
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def is_current(self, seq):
+        if self.mm is None:
+            return False
+        offset = HEADER_SIZE + (seq % self.num_slots) * self.stride
+        return struct.unpack_from("<Q", self.mm, offset)[0] == seq
+
+    def close(self):
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                # Frame views still reference the map; it is released with them
+                pass
+            self.mm = None
+            self.inode = None
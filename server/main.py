@@ -1,14 +1,41 @@
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, Request, Response
 from fastapi.responses import StreamingResponse
-import cv2
-import os
+import asyncio
 import subprocess
-import time
 from fastapi.middleware.cors import CORSMiddleware
+from metrics import MetricsCollector
+from frame_bus import FrameBusReader
+from video_hub import VideoHub
+from event_bus import EventBroadcaster, EventServer, format_sse
+from worker import DetectionWorker
 
 app = FastAPI()
-cap = None
-detection_process = None
+streaming = False
+detection_worker = DetectionWorker()
+metrics_collector = MetricsCollector()
+frame_bus = FrameBusReader()
+video_hub = VideoHub(frame_bus)
+status_events = EventBroadcaster()
+gemini_events = EventBroadcaster(history_size=100)
+KEEPALIVE_INTERVAL = 15.0
+
+def publish_gemini_event(event):
+    latest = gemini_events.latest
+    # The detection process re-sends its last response after reconnecting
+    if event.get("final") and latest is not None and latest["final"] and latest["text"] == event["text"]:
+        return
+    gemini_events.publish({"text": event["text"], "delta": event.get("delta", ""),
+                           "final": event.get("final", True)})
+
+def update_worker_state(event):
+    detection_worker.set_state(event["state"], event.get("pid"))
+    print(f"Detection worker {event['state']}")
+
+event_server = EventServer({
+    "status": lambda event: status_events.publish(event["status"]),
+    "gemini": publish_gemini_event,
+    "worker": update_worker_state,
+})
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,64 +45,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_metrics_collector():
+    metrics_collector.start()
+
+@app.on_event("startup")
+async def start_event_server():
+    await event_server.start()
+
+@app.on_event("startup")
+def start_detection_worker():
+    # Preload the detection process at boot so arming it is near-instant
+    detection_worker.start()
+
+@app.on_event("shutdown")
+def stop_detection_worker():
+    detection_worker.stop()
+
+@app.get("/metrics")
+def metrics():
+    return Response(metrics_collector.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/drowsiness/start")
 def start_drowsiness():
-    global detection_process
-    if detection_process is None:
-        script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'prediction/src/main.py'))
-        python_path = subprocess.check_output(['pyenv', 'prefix', 'edp']).decode('utf-8').strip()
-        python_path = os.path.join(python_path, 'bin', 'python')
-        detection_process = subprocess.Popen([python_path, script_path, "--config", os.path.join(os.path.dirname(script_path), '..', 'config/config.yaml')])
-
+    # The worker is already running with models loaded; arming starts processing
+    detection_worker.arm()
     return {"status": "started"}
 
 @app.post("/drowsiness/stop")
 def stop_drowsiness():
-    global detection_process
-    if detection_process:
-        detection_process.terminate()
-        detection_process = None
+    detection_worker.disarm()
     return {"status": "stopped"}
 
+@app.get("/drowsiness/worker")
+def worker_status():
+    return {"state": detection_worker.state, "armed": detection_worker.armed,
+            "restarts": detection_worker.restarts}
+
 @app.get("/drowsiness/live_status")
 def live_status():
-    def event_stream():
-        last_status = "AWAKE"
-        while True:
-            try:
-                with open("/tmp/drowsiness_status.txt", "r") as f:
-                    current_status = f.read().strip()
-                if current_status != last_status:
-                    last_status = current_status
-                    yield f"data: {current_status}\n\n"
-            except:
-                yield "data: unknown\n\n"
-            time.sleep(1)
+    async def event_stream():
+        # Status transitions are pushed by the detection process as they happen
+        queue = status_events.subscribe()
+        try:
+            while True:
+                try:
+                    _, status = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(status)
+        finally:
+            status_events.unsubscribe(queue)
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 @app.get("/camera/start")
 def start_camera():
-    global cap
-    cap = cv2.VideoCapture(0)
+    global streaming
+    streaming = True
     return {"status": "camera started"}
 
 @app.get("/camera/stop")
 def stop_camera():
-    global cap
-    if cap:
-        cap.release()
-        cap = None
+    global streaming
+    streaming = False
     return {"status": "camera stopped"}
 
-def gen_frames():
-    global cap
-    while cap and cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            break
-        _, buffer = cv2.imencode('.jpg', frame)
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+async def gen_frames():
+    subscriber = video_hub.subscribe()
+    try:
+        while streaming:
+            try:
+                frame = await asyncio.wait_for(subscriber.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            yield frame
+    finally:
+        video_hub.unsubscribe(subscriber)
 
 @app.get("/video")
 def video_feed():
@@ -95,14 +141,27 @@ def shutdown():
     return {"status": "shutting down"}
 
 @app.get("/gemini_response")
-def get_gemini_response():
-    def event_stream():
-        while True:
-            try:
-                with open("/tmp/gemini_response.txt", "r") as f:
-                    current_text = f.read().strip()
-                yield f"data: {current_text}\n\n"
-            except:
-                yield "data: \n\n"
-            time.sleep(1)
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
\ No newline at end of file
+def get_gemini_response(request: Request):
+    try:
+        last_event_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        last_event_id = None
+
+    async def event_stream():
+        # Each response turn is sent once: optional "delta" events with the new text,
+        # then the full text as a default message event. A reconnecting client
+        # resumes after its Last-Event-ID; others start from the current text.
+        queue = gemini_events.subscribe(last_event_id)
+        try:
+            while True:
+                try:
+                    seq, event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["delta"]:
+                    yield format_sse(event["delta"], event="delta", event_id=seq)
+                yield format_sse(event["text"], event_id=seq)
+        finally:
+            gemini_events.unsubscribe(queue)
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -0,0 +1,97 @@
+"""
+Receives metrics snapshots from the detection process and renders them in
+Prometheus text format.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from config import config
+
+METRICS_SOCKET_PATH = config.get("metrics", {}).get("socket_path", "/tmp/nocturne_metrics.sock")
+METRIC_PREFIX = "nocturne_"
+STALE_AFTER_SECONDS = 10.0
+
+
+class MetricsCollector:
+    def __init__(self, socket_path=METRICS_SOCKET_PATH):
+        self.socket_path = socket_path
+        self.snapshot = None
+        self.received_at = 0.0
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.socket_path)
+        self.thread = threading.Thread(target=self._receive, daemon=True)
+        self.thread.start()
+
+    def _receive(self):
+        while True:
+            try:
+                payload = self.sock.recv(1 << 20)
+                self.snapshot = json.loads(payload.decode("utf-8"))
+                self.received_at = time.time()
+            except (OSError, ValueError) as e:
+                print(f"Error receiving metrics: {e}")
+                time.sleep(1)
+
+    def render(self):
+        snapshot = self.snapshot
+        up = snapshot is not None and time.time() - self.received_at < STALE_AFTER_SECONDS
+        lines = [
+            f"# TYPE {METRIC_PREFIX}detection_up gauge",
+            f"{METRIC_PREFIX}detection_up {1 if up else 0}",
+        ]
+        if snapshot is None:
+            return "\n".join(lines) + "\n"
+
+        # Each metric family must be contiguous: group samples by name before writing
+        families = OrderedDict()
+
+        def family(name, metric_type):
+            if name not in families:
+                families[name] = (metric_type, [])
+            return families[name][1]
+
+        for histogram in snapshot.get("histograms", []):
+            name = METRIC_PREFIX + histogram["name"]
+            samples = family(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"] + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                labels = _format_labels(dict(histogram["labels"], le=str(bound)))
+                samples.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _format_labels(histogram["labels"])
+            samples.append(f"{name}_sum{labels} {histogram['sum']}")
+            samples.append(f"{name}_count{labels} {histogram['count']}")
+
+        for kind, entries in (("counter", snapshot.get("counters", [])), ("gauge", snapshot.get("gauges", []))):
+            for entry in entries:
+                name = METRIC_PREFIX + entry["name"]
+                metric_type = "counter" if kind == "counter" or name.endswith("_total") else "gauge"
+                family(name, metric_type).append(f"{name}{_format_labels(entry['labels'])} {entry['value']}")
+
+        for name, (metric_type, samples) in families.items():
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
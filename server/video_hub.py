@@ -0,0 +1,97 @@
+"""
+Encode-once MJPEG broadcast hub: every frame from the detection worker's frame bus
+is resized and JPEG-encoded a single time and the bytes are fanned out to all
+/video subscribers.
+"""
+
+import asyncio
+import os
+import threading
+
+import cv2
+
+from config import config
+
+# /video encoding settings from config.yaml; NOCTURNE_PREVIEW_* environment variables override them
+_preview = config.get("video_preview", {})
+PREVIEW_QUALITY = int(os.environ.get("NOCTURNE_PREVIEW_QUALITY", _preview.get("quality", 70)))
+PREVIEW_WIDTH = int(os.environ.get("NOCTURNE_PREVIEW_WIDTH", _preview.get("width", 0)))
+PREVIEW_HEIGHT = int(os.environ.get("NOCTURNE_PREVIEW_HEIGHT", _preview.get("height", 0)))
+
+
+class Subscriber:
+    # Holds only the latest encoded frame, so a slow client skips frames instead of
+    # queueing them or holding up the other clients
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.frame = None
+
+    def put(self, frame):
+        self.frame = frame
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # Event loop already closed; the subscriber is going away
+            pass
+
+    async def get(self):
+        await self.event.wait()
+        self.event.clear()
+        return self.frame
+
+
+class VideoHub:
+    def __init__(self, frame_bus, quality=PREVIEW_QUALITY, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT):
+        self.frame_bus = frame_bus
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self.size = (width, height) if width > 0 and height > 0 else None
+        self.resized = None
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.frames_encoded = 0
+
+    def subscribe(self):
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _encode(self, frame):
+        if self.size is not None and frame.shape[1::-1] != self.size:
+            self.resized = cv2.resize(frame, self.size, dst=self.resized, interpolation=cv2.INTER_AREA)
+            frame = self.resized
+        ok, buffer = cv2.imencode('.jpg', frame, self.encode_params)
+        if not ok:
+            return None
+        self.frames_encoded += 1
+        return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n'
+
+    def _run(self):
+        last_seq = 0
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+                subscribers = list(self.subscribers)
+
+            # Frames from the detection worker, encoded straight from shared memory
+            self.frame_bus.touch()
+            latest = self.frame_bus.wait_next(last_seq, timeout=0.5)
+            if latest is None:
+                continue
+            last_seq, frame, _ = latest
+            data = self._encode(frame)
+            if data is None or not self.frame_bus.is_current(last_seq):
+                continue
+            for subscriber in subscribers:
+                subscriber.put(data)
@@ -0,0 +1,119 @@
+"""
+Supervises a warm-standby detection worker: the detection process is started at
+server boot with all models loaded and waits for arm / disarm commands on stdin.
+It is restarted automatically if it exits.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from config import CONFIG_PATH
+
+PREDICTION_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'prediction'))
+MAX_RESTART_DELAY = 30.0
+
+
+def detection_python():
+    # The detection dependencies live in the "edp" pyenv environment when available
+    try:
+        prefix = subprocess.check_output(['pyenv', 'prefix', 'edp'], stderr=subprocess.DEVNULL)
+        return os.path.join(prefix.decode('utf-8').strip(), 'bin', 'python')
+    except (OSError, subprocess.CalledProcessError):
+        return sys.executable
+
+
+class DetectionWorker:
+    def __init__(self):
+        self.script_path = os.path.join(PREDICTION_DIR, 'src', 'main.py')
+        # Same config file the server reads its socket and frame bus paths from
+        self.config_path = CONFIG_PATH
+        self.python_path = None
+        self.process = None
+        self.armed = False
+        self.state = "stopped"
+        self.restarts = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.python_path = detection_python()
+        self.thread = threading.Thread(target=self._supervise, daemon=True)
+        self.thread.start()
+
+    def _spawn(self):
+        with self.lock:
+            self.process = subprocess.Popen(
+                [self.python_path, self.script_path, "--config", self.config_path, "--standby"],
+                stdin=subprocess.PIPE)
+            self.state = "starting"
+            # A restarted worker picks up the requested state immediately
+            if self.armed:
+                self._send("arm")
+            return self.process
+
+    def _supervise(self):
+        delay = 1.0
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            try:
+                code = self._spawn().wait()
+            except OSError as e:
+                # Bad interpreter or script path; keep retrying in case it gets fixed
+                code = e
+            with self.lock:
+                if self.stopped.is_set():
+                    break
+                self.process = None
+                self.state = "restarting"
+                self.restarts += 1
+            # Back off while the worker keeps failing right after start
+            if time.monotonic() - started > MAX_RESTART_DELAY:
+                delay = 1.0
+            print(f"Detection worker exited ({code}); restarting in {delay:.0f}s")
+            self.stopped.wait(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+    def set_state(self, state, pid=None):
+        # Reported by the worker itself; ignore events from a process that has been replaced
+        with self.lock:
+            if self.process is None or (pid is not None and pid != self.process.pid):
+                return
+            self.state = state
+
+    def _send(self, command):
+        if self.process is None or self.process.poll() is not None:
+            return
+        try:
+            self.process.stdin.write(f"{command}\n".encode('utf-8'))
+            self.process.stdin.flush()
+        except OSError as e:
+            print(f"Error sending '{command}' to detection worker: {e}")
+
+    def arm(self):
+        with self.lock:
+            self.armed = True
+            self._send("arm")
+
+    def disarm(self):
+        with self.lock:
+            self.armed = False
+            self._send("disarm")
+
+    def stop(self):
+        with self.lock:
+            self.stopped.set()
+            process = self.process
+            self._send("quit")
+        if process is not None:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        with self.lock:
+            self.state = "stopped"